@@ -0,0 +1,166 @@
+"""Rerun latency benchmark: drives the Streamlit app headlessly against a local fake OpenAI server.
+
+Each scenario sets up the sidebar, warms up, then times ``--runs`` reruns that
+each change one input the way a user would. p50/p95 wall time per rerun is
+reported along with the median of every profiled stage (see cortex_metrics).
+
+    python benchmarks/bench_reruns.py --runs 20 --llm-latency 0.3 --json bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SCRIPT = os.path.join(REPO_DIR, "cortex_mindmap.py")
+
+# -------------------------------
+# WIDGET HELPERS
+# -------------------------------
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def set_inputs(at, vertical="-", top_priority="-", days=30, granularity=None, refine=False):
+    _widget(at.sidebar.selectbox, "Client Vertical").set_value(vertical)
+    _widget(at.sidebar.selectbox, "Top Priority Objective").set_value(top_priority)
+    start = datetime.date.today()
+    _widget(at.sidebar.date_input, "Campaign Start Date").set_value(start)
+    _widget(at.sidebar.date_input, "Campaign End Date").set_value(start + datetime.timedelta(days=days))
+    at.run()
+    if granularity is not None:
+        _widget(at.selectbox, "Flighting Granularity").set_value(granularity)
+    if refine:
+        _widget(at.checkbox, "Refine flighting with AI").check()
+    at.run()
+
+
+def change_brand(at, i):
+    _widget(at.sidebar.text_input, "Brand Name").set_value(f"Bench Brand {i}")
+
+
+def change_investment(at, i):
+    _widget(at.sidebar.number_input, "Investment Range - High-end ($)").set_value(200000 + 1000 * (i + 1))
+
+
+def edit_allocation(at, i):
+    allocation = next(n for n in at.sidebar.number_input if n.label.startswith("Allocation for"))
+    allocation.set_value(10 + i % 20)
+    _widget(at.sidebar.button, "Apply Allocations").click()
+
+
+def run_plan(at, i):
+    change_brand(at, i)
+    _widget(at.sidebar.button, "Run Plan").click()
+
+# -------------------------------
+# SCENARIOS: (name, setup kwargs, per-rerun action)
+# -------------------------------
+SCENARIOS = [
+    ("no_objective", dict(), change_brand),
+    ("cpg_growth_30d", dict(vertical="CPG", top_priority="Growth"), change_investment),
+    ("retail_awareness_1y_daily", dict(vertical="Retail", top_priority="Awareness", days=365, granularity="Daily"),
+     change_investment),
+    ("travel_ai_flighting_90d", dict(vertical="Travel", top_priority="Awareness", days=90, refine=True), change_brand),
+    ("technology_manual_edit", dict(vertical="Technology", top_priority="Buy Rate"), edit_allocation),
+    ("finance_run_plan", dict(vertical="Finance", top_priority="Profitability", days=60), run_plan),
+]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def _read_metrics(path, offset):
+    with open(path, "r", encoding="utf-8") as f:
+        f.seek(offset)
+        return [json.loads(line) for line in f if line.strip()], f.tell()
+
+
+def run_scenario(name, setup, action, runs, warmup, metrics_path):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+    at.secrets["OPENAI_API_KEY"] = "sk-bench"
+    at.run()
+    set_inputs(at, **setup)
+    for i in range(warmup):
+        action(at, -1 - i)
+        at.run()
+    offset = os.path.getsize(metrics_path)
+    timings = []
+    for i in range(runs):
+        action(at, i)
+        start = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+    profiles, _ = _read_metrics(metrics_path, offset)
+    stages = {}
+    for profile in profiles:
+        for stage, ms in profile["stages_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "scenario": name,
+        "runs": runs,
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "max_ms": round(max(timings), 2),
+        "stage_p50_ms": {stage: round(percentile(values, 50), 2) for stage, values in stages.items()},
+        "llm_calls": sum(p["llm"]["calls"] for p in profiles),
+        "llm_cache_hits": sum(p["llm"]["cache_hits"] for p in profiles),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Cortex rerun latency with a fake OpenAI backend.")
+    parser.add_argument("--runs", type=int, default=20, help="Timed reruns per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed reruns per scenario before timing")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the fake server waits per request")
+    parser.add_argument("--backend", choices=("openai", "stub"), default="openai",
+                        help="LLM backend: the fake OpenAI server over HTTP, or the in-process offline stub")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario(s)")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="cortex-bench-")
+    metrics_path = os.path.join(workdir, "metrics.jsonl")
+    open(metrics_path, "w").close()
+    # Read by the app modules at import time, so set before the first AppTest run.
+    os.environ.update(CORTEX_PROFILE="1", CORTEX_METRICS_PATH=metrics_path,
+                      CORTEX_CACHE_DIR=os.path.join(workdir, "cache"),
+                      CORTEX_PLAN_STORE=os.path.join(workdir, "plans.sqlite3"), CORTEX_LLM_BACKEND=args.backend,
+                      CORTEX_LLM_RATE="1000", CORTEX_LLM_BURST="1000")
+    sys.path.insert(0, REPO_DIR)
+
+    from fake_openai import start_fake_openai
+    import openai
+
+    server, openai.api_base = start_fake_openai(latency=args.llm_latency)
+    results = []
+    try:
+        for name, setup, action in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            result = run_scenario(name, setup, action, args.runs, args.warmup, metrics_path)
+            results.append(result)
+            print(f"{name:<28} p50 {result['p50_ms']:>8.1f} ms   p95 {result['p95_ms']:>8.1f} ms   "
+                  f"llm calls {result['llm_calls']:>3} (cached {result['llm_cache_hits']})")
+            slowest = sorted(result["stage_p50_ms"].items(), key=lambda item: -item[1])[:4]
+            print("    " + ", ".join(f"{stage} {ms:.1f}" for stage, ms in slowest))
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"llm_latency": args.llm_latency, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
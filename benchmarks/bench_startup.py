@@ -0,0 +1,117 @@
+"""Cold-start benchmark: import time of the heavy dependencies and app modules, and time to first render.
+
+Every measurement runs in a fresh interpreter so nothing is already imported
+or cached. Import times are the median over ``--runs`` processes, together
+with the heavy libraries each app module pulls in at import (ideally none).
+Time to first render drives the app headlessly once, cold and after
+``cortex_warmup.warm_up()``, and reports which heavy libraries the first
+render loaded.
+
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SCRIPT = os.path.join(REPO_DIR, "cortex_mindmap.py")
+
+HEAVY_MODULES = ("pandas", "pyarrow", "openai", "aiohttp", "fpdf", "plotly.graph_objects", "streamlit")
+APP_MODULES = ("cortex_catalog", "cortex_flighting", "cortex_charts", "cortex_llm", "cortex_report", "cortex_store",
+               "cortex_memory", "cortex_batch")
+TRACKED = ("pandas", "pyarrow", "openai", "aiohttp", "fpdf")
+
+
+# -------------------------------
+# CHILD PROCESS MEASUREMENTS (print one JSON line)
+# -------------------------------
+def _loaded():
+    return [name for name in TRACKED if name in sys.modules]
+
+
+def child_import(module):
+    start = time.perf_counter()
+    __import__(module)
+    return {"import_ms": (time.perf_counter() - start) * 1000, "loaded": _loaded()}
+
+
+def child_render(warm):
+    warmup_ms = 0.0
+    if warm:
+        from cortex_warmup import warm_up
+
+        start = time.perf_counter()
+        warm_up()
+        warmup_ms = (time.perf_counter() - start) * 1000
+    from streamlit.testing.v1 import AppTest
+
+    before = set(_loaded())
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+    start = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    start = time.perf_counter()
+    at.run()
+    rerun_ms = (time.perf_counter() - start) * 1000
+    return {"warmup_ms": warmup_ms, "first_render_ms": first_ms, "rerun_ms": rerun_ms,
+            "loaded_by_render": [name for name in _loaded() if name not in before]}
+
+
+def _spawn(args, env):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *args], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median(values):
+    return round(float(np.median(values)), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Cortex cold start: imports and time to first render.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--json", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        kind, value = args.child
+        sys.path.insert(0, REPO_DIR)
+        print(json.dumps(child_import(value) if kind == "import" else child_render(value == "warm")))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="cortex-startup-")
+    env = dict(os.environ, CORTEX_LLM_BACKEND="stub", CORTEX_CACHE_DIR=os.path.join(workdir, "cache"),
+               CORTEX_PLAN_STORE=os.path.join(workdir, "plans.sqlite3"),
+               CORTEX_READY_FILE=os.path.join(workdir, "ready"))
+    results = {"imports": [], "first_render": []}
+    for module in HEAVY_MODULES + APP_MODULES:
+        samples = [_spawn(["import", module], env) for _ in range(args.runs)]
+        result = {"module": module, "import_ms": median([s["import_ms"] for s in samples]),
+                  "loaded": samples[0]["loaded"]}
+        results["imports"].append(result)
+        print(f"import {module:<22} {result['import_ms']:>8.1f} ms   loads {', '.join(result['loaded']) or '-'}")
+    for mode in ("cold", "warm"):
+        samples = [_spawn(["render", mode], env) for _ in range(args.runs)]
+        result = {"mode": mode, **{key: median([s[key] for s in samples])
+                                   for key in ("warmup_ms", "first_render_ms", "rerun_ms")},
+                  "loaded_by_render": samples[0]["loaded_by_render"]}
+        results["first_render"].append(result)
+        print(f"first render ({mode:<4}) {result['first_render_ms']:>8.1f} ms   rerun {result['rerun_ms']:>7.1f} ms   "
+              f"warm-up {result['warmup_ms']:>7.1f} ms   loads {', '.join(result['loaded_by_render']) or '-'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
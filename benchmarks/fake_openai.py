@@ -0,0 +1,71 @@
+"""Local stand-in for the OpenAI chat completions endpoint used by the benchmarks.
+
+Flighting prompts get an even monthly split per channel; every other prompt gets
+a canned plan summary, streamed as server-sent events when ``stream`` is set.
+``latency`` seconds are added before each response to mimic a real provider.
+"""
+import ast
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_PLAN = "TLDR: Benchmark plan summary. " + "Creative themes, key audiences and flighting guidance. " * 30
+
+
+def _completion_text(prompt):
+    channels = re.search(r"channel names: (\[.*?\])\.", prompt)
+    months = re.search(r"list of (\d+) integers", prompt)
+    if channels and months:
+        n = int(months.group(1))
+        names = ast.literal_eval(channels.group(1))
+        return json.dumps({ch: [100 // n] * (n - 1) + [100 - 100 // n * (n - 1)] for ch in names})
+    return FAKE_PLAN
+
+
+class _Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    chunk_delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = _completion_text(body["messages"][-1]["content"])
+        time.sleep(self.latency)
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in content.split(" "):
+                chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        data = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                      "total_tokens": prompt_tokens + len(content) // 4},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_openai(latency=0.0, chunk_delay=0.0, host="127.0.0.1", port=0):
+    """Serve in a daemon thread; returns ``(server, api_base)``. Call ``server.shutdown()`` to stop."""
+    handler = type("FakeOpenAIHandler", (_Handler,), {"latency": latency, "chunk_delay": chunk_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
@@ -0,0 +1,85 @@
+"""Array-backed channel allocation engine (verticals x objectives x channels)."""
+from functools import lru_cache
+
+import numpy as np
+
+from cortex_catalog import get_catalog
+
+NO_OBJECTIVE = "-"
+
+
+class AllocationEngine:
+    """Precomputed normalized allocations for every (vertical, objective) pair of a ``Catalog``.
+
+    ``tensor[v, o, c]`` is the percentage of budget for channel ``c``; objective
+    index 0 is "no objective" (the raw vertical mix). Unknown verticals map to an
+    all-zero row and unknown objectives to the raw mix, as the dict version did.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = catalog.version
+        self.verticals = list(catalog.verticals)
+        self.objectives = [NO_OBJECTIVE] + list(catalog.objectives)
+        self.channels = list(catalog.channels)
+        self._vertical_index = catalog.vertical_index
+        self._objective_index = {o: i for i, o in enumerate(self.objectives)}
+
+        # The extra last vertical row stays zero and absorbs unknown verticals.
+        raw = np.zeros((len(self.verticals) + 1, len(self.channels)))
+        self.present = np.zeros(raw.shape, dtype=bool)
+        raw[:-1], self.present[:-1] = catalog.mix, catalog.present
+        multipliers = np.vstack([np.ones(len(self.channels)), catalog.adjustments])
+
+        adjusted = raw[:, np.newaxis, :] * multipliers[np.newaxis, :, :]
+        totals = adjusted.sum(axis=2, keepdims=True)
+        self.tensor = np.divide(adjusted * 100, totals, out=np.zeros_like(adjusted), where=totals > 0)
+        self.tensor.setflags(write=False)
+
+    def vertical_indices(self, verticals):
+        unknown = len(self.verticals)
+        return self._indices(verticals, self._vertical_index, unknown)
+
+    def objective_indices(self, objectives):
+        return self._indices(objectives, self._objective_index, 0)
+
+    def lookup(self, vertical, objective):
+        """O(1) read-only slice of channel percentages for one vertical/objective."""
+        v = self._vertical_index.get(vertical, len(self.verticals))
+        return self.tensor[v, self._objective_index.get(objective, 0)]
+
+    def allocation(self, vertical, objective):
+        """Dict form of ``lookup`` restricted to the vertical's channels."""
+        v = self._vertical_index.get(vertical, len(self.verticals))
+        row = self.tensor[v, self._objective_index.get(objective, 0)]
+        return {ch: float(row[c]) for c, ch in enumerate(self.channels) if self.present[v, c]}
+
+    def batch(self, verticals, objectives, budgets):
+        """Normalized percentages and per-channel investment for N briefs at once.
+
+        Returns two N x channels arrays: ``(allocations, investment)``.
+        """
+        allocations = self.tensor[self.vertical_indices(verticals), self.objective_indices(objectives)]
+        investment = allocations / 100 * np.asarray(budgets, dtype=float)[:, np.newaxis]
+        return allocations, investment
+
+    @staticmethod
+    def _indices(names, index, default):
+        names = np.asarray(names, dtype=object)
+        uniques, inverse = np.unique(names.astype(str), return_inverse=True)
+        mapped = np.array([index.get(name, default) for name in uniques], dtype=np.intp)
+        return mapped[inverse.reshape(-1)]
+
+
+@lru_cache(maxsize=2)
+def _engine_for(catalog):
+    return AllocationEngine(catalog)
+
+
+def get_allocation_engine():
+    """The engine for the current catalog; rebuilt only when the catalog is reloaded."""
+    return _engine_for(get_catalog())
+
+
+def compute_normalized_allocation(vertical, top_priority):
+    return get_allocation_engine().allocation(vertical, top_priority)
@@ -0,0 +1,266 @@
+"""Headless batch planning: run many client briefs without Streamlit.
+
+Briefs are read from CSV or JSONL with the same fields as the sidebar inputs
+(``brand_name``, ``business_problem``, ``investment_low``, ``vertical``,
+``top_priority``, ...; list fields in CSV are ``;``-separated). Each brief is
+allocated, flighted, summarized by the LLM and rendered to PDF. One JSON line
+per finished brief is appended to the output file as soon as it is ready,
+and rerunning with the same output file skips briefs already marked ``ok``.
+
+    python cortex_batch.py briefs.csv -o plans.jsonl --pdf-dir reports
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from cortex_allocation import NO_OBJECTIVE, get_allocation_engine
+from cortex_cache import make_cache_key
+from cortex_catalog import get_catalog
+from cortex_flighting import FlightingPlan
+from cortex_llm import get_llm_client
+from cortex_orchestrator import is_retryable
+from cortex_planning import PLAN_TIMEOUT, agenerate_full_plan, build_base_plan_summary, build_full_plan_messages
+from cortex_report import build_report, render_report
+
+LIST_FIELDS = ("marketing_priorities", "creative_formats")
+DATE_FIELDS = ("campaign_start", "campaign_end")
+BRIEF_DEFAULTS = {
+    "brand_name": "-", "business_problem": "-", "additional_business_info": "-",
+    "investment_low": 100000, "investment_high": 200000,
+    "vertical": "-", "top_priority": "-", "brand_lifecycle": "-",
+    "marketing_priorities": [], "creative_formats": [],
+}
+
+# -------------------------------
+# READING BRIEFS
+# -------------------------------
+def read_briefs(path):
+    """Yield raw brief dicts from a .csv or .jsonl file."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def normalize_brief(raw):
+    """Fill defaults, parse numbers, dates and list fields, check names against the catalog, assign ``brief_id``."""
+    brief = dict(BRIEF_DEFAULTS)
+    brief.update({k: v for k, v in raw.items() if v not in (None, "")})
+    for field in LIST_FIELDS:
+        if isinstance(brief[field], str):
+            brief[field] = [item.strip() for item in brief[field].split(";") if item.strip()]
+    catalog = get_catalog()
+    for field, known in (("vertical", catalog.vertical_index), ("top_priority", catalog.objective_index)):
+        if brief[field] != NO_OBJECTIVE and brief[field] not in known:
+            raise ValueError(f"Unknown {field} {brief[field]!r}")
+    brief["investment_low"] = int(float(brief["investment_low"]))
+    brief["investment_high"] = int(float(brief["investment_high"]))
+    today = datetime.date.today()
+    brief["campaign_start"] = _parse_date(brief.get("campaign_start"), today)
+    brief["campaign_end"] = _parse_date(brief.get("campaign_end"), brief["campaign_start"] + datetime.timedelta(days=30))
+    if not brief.get("brief_id"):
+        # Date defaults depend on the day of the run; keeping them out of the id lets a run resumed
+        # on a later day still recognize the dateless briefs it already planned.
+        defaulted = {field for field in DATE_FIELDS if raw.get(field) in (None, "")}
+        brief["brief_id"] = make_cache_key(**{k: v for k, v in brief.items()
+                                              if k != "brief_id" and k not in defaulted})[:16]
+    return brief
+
+
+def invalid_brief_record(raw, error):
+    """Output record for a brief that could not be normalized (bad number, date, unknown vertical, ...)."""
+    brief_id = raw.get("brief_id") or make_cache_key(**{k: v for k, v in raw.items() if v not in (None, "")})[:16]
+    return {"brief_id": brief_id, "brand_name": raw.get("brand_name"), "status": "error",
+            "error": f"Invalid brief: {type(error).__name__}: {error}"}
+
+
+def _parse_date(value, default):
+    if value in (None, ""):
+        return default
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def load_checkpoint(output_path):
+    """Brief ids already completed successfully in a previous run."""
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # partially written last line from an interrupted run
+                if record.get("status") == "ok":
+                    done.add(record["brief_id"])
+    return done
+
+# -------------------------------
+# PER-BRIEF STAGES
+# -------------------------------
+def plan_inputs_for(brief, allocation_row, present_row, channels):
+    # Same defaults the sidebar would show: normalized mix rounded to whole percents.
+    updated_allocations = {ch: int(round(allocation_row[c])) for c, ch in enumerate(channels) if present_row[c]}
+    return dict(
+        brand_name=brief["brand_name"], business_problem=brief["business_problem"],
+        additional_business_info=brief["additional_business_info"], vertical=brief["vertical"],
+        creative_formats=brief["creative_formats"], investment_low=brief["investment_low"],
+        investment_high=brief["investment_high"], campaign_start=brief["campaign_start"],
+        campaign_end=brief["campaign_end"], updated_allocations=updated_allocations,
+        base_summary=build_base_plan_summary(brief["top_priority"], brief["brand_lifecycle"], brief["vertical"]),
+        marketing_priorities=brief["marketing_priorities"], top_priority=brief["top_priority"],
+        brand_lifecycle=brief["brand_lifecycle"],
+    )
+
+
+def render_plan_artifacts(brief_id, plan_inputs, recommended, final_plan, pdf_dir, granularity="Calendar Month"):
+    """CPU-bound stage run in a worker process: flighting matrix and the PDF report with its charts."""
+    mid_investment = (plan_inputs["investment_low"] + plan_inputs["investment_high"]) / 2
+    allocations = plan_inputs["updated_allocations"]
+    channels = list(allocations)
+    plan = FlightingPlan.build(
+        channels, [mid_investment * allocations[ch] / 100 for ch in channels],
+        plan_inputs["campaign_start"], plan_inputs["campaign_end"],
+        plan_inputs["vertical"], plan_inputs["top_priority"],
+    )
+    _, matrix = plan.rollup(granularity)
+    flighting = {
+        "granularity": granularity,
+        "periods": plan.labels(granularity),
+        "investment": {ch: [round(v, 2) for v in matrix[i]] for i, ch in enumerate(channels)},
+    }
+    pdf_path = None
+    if pdf_dir:
+        pdf_path = os.path.join(pdf_dir, f"{brief_id}.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(render_report(build_report(plan_inputs, final_plan, recommended, plan, granularity)))
+    return flighting, pdf_path
+
+
+async def _final_plan(plan_inputs, semaphore, use_llm, retries):
+    if not use_llm:
+        return plan_inputs["base_summary"]
+    messages = build_full_plan_messages(**plan_inputs)
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(agenerate_full_plan(messages), timeout=PLAN_TIMEOUT)
+            except Exception as e:
+                if attempt >= retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(0.5 * (2 ** attempt))
+
+# -------------------------------
+# PIPELINE
+# -------------------------------
+async def run_batch_async(briefs, output_path, pdf_dir=None, llm_concurrency=8, workers=None,
+                          use_llm=True, retries=2, granularity="Calendar Month", zip_path=None):
+    """Plan every brief not already checkpointed in ``output_path``; returns (done, failed) counts.
+
+    With ``zip_path`` each rendered PDF is also added to that archive as it completes.
+    """
+    # A bad row is reported in the output like any failed brief instead of stopping the batch.
+    normalized, invalid = [], []
+    for raw in briefs:
+        try:
+            normalized.append(normalize_brief(raw))
+        except (TypeError, ValueError) as e:
+            invalid.append(invalid_brief_record(raw, e))
+    briefs = normalized
+    if zip_path and not pdf_dir:
+        raise ValueError("zip_path requires pdf_dir")
+    completed = load_checkpoint(output_path)
+    pending = [b for b in briefs if b["brief_id"] not in completed]
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    # Allocation for the whole batch in one vectorized lookup.
+    engine = get_allocation_engine()
+    allocations, _ = engine.batch(
+        [b["vertical"] for b in pending], [b["top_priority"] for b in pending], [0] * len(pending)
+    )
+    present = engine.present[engine.vertical_indices([b["vertical"] for b in pending])]
+
+    semaphore = asyncio.Semaphore(llm_concurrency)
+    loop = asyncio.get_running_loop()
+    done, failed = 0, len(invalid)
+
+    archive = zipfile.ZipFile(zip_path, "a", compression=zipfile.ZIP_DEFLATED) if zip_path else None
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "a", encoding="utf-8") as out:
+        for record in invalid:
+            out.write(json.dumps(record, default=str) + "\n")
+        out.flush()
+        async def process(i, brief):
+            record = {"brief_id": brief["brief_id"], "brand_name": brief["brand_name"]}
+            try:
+                plan_inputs = plan_inputs_for(brief, allocations[i], present[i], engine.channels)
+                recommended = {ch: float(allocations[i][c]) for c, ch in enumerate(engine.channels) if present[i][c]}
+                record["updated_allocations"] = plan_inputs["updated_allocations"]
+                final_plan = await _final_plan(plan_inputs, semaphore, use_llm, retries)
+                flighting, pdf_path = await loop.run_in_executor(
+                    pool, render_plan_artifacts, brief["brief_id"], plan_inputs, recommended, final_plan, pdf_dir,
+                    granularity,
+                )
+                record.update(status="ok", final_plan=final_plan, flighting=flighting, pdf_path=pdf_path)
+            except Exception as e:
+                record.update(status="error", error=f"{type(e).__name__}: {e}")
+            return record
+
+        tasks = [asyncio.ensure_future(process(i, b)) for i, b in enumerate(pending)]
+        for next_done in asyncio.as_completed(tasks):
+            record = await next_done
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            if archive is not None and record.get("pdf_path"):
+                archive.write(record["pdf_path"], os.path.basename(record["pdf_path"]))
+            if record["status"] == "ok":
+                done += 1
+            else:
+                failed += 1
+    if archive is not None:
+        archive.close()
+    if use_llm:
+        await get_llm_client().aclose()
+    return done, failed
+
+
+def run_batch(briefs, output_path, **kwargs):
+    return asyncio.run(run_batch_async(briefs, output_path, **kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Cortex planning for a file of client briefs.")
+    parser.add_argument("briefs", help="CSV or JSONL file of client briefs")
+    parser.add_argument("-o", "--output", default="plans.jsonl", help="JSONL output (also the resume checkpoint)")
+    parser.add_argument("--pdf-dir", default=None, help="Directory for per-brief PDF reports")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Maximum in-flight LLM requests")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for flighting and PDF rendering")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed LLM request")
+    parser.add_argument("--granularity", default="Calendar Month", help="Flighting granularity in the output")
+    parser.add_argument("--zip", default=None, help="Also collect the PDFs into this ZIP (requires --pdf-dir)")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the AI summary and use the base strategy summary")
+    args = parser.parse_args(argv)
+    if args.zip and not args.pdf_dir:
+        parser.error("--zip requires --pdf-dir")
+
+    done, failed = run_batch(
+        read_briefs(args.briefs), args.output, pdf_dir=args.pdf_dir, llm_concurrency=args.llm_concurrency,
+        workers=args.workers, use_llm=not args.no_llm, retries=args.retries, granularity=args.granularity,
+        zip_path=args.zip,
+    )
+    print(f"{done} plans written to {args.output}, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
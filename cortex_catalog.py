@@ -0,0 +1,337 @@
+"""Planning taxonomy catalog: channels, objectives and verticals loaded from versioned JSON files.
+
+``catalog/taxonomy.json`` is the base taxonomy; any ``catalog/overrides/*.json``
+files are applied on top in name order (client-specific weights, extra
+sub-verticals or channel line items). Each section is a list of entries keyed
+by ``name``: an override entry with a known name is merged into it (``mix``,
+``adjustments`` and ``details`` key by key), a new name is appended. A
+vertical may name a ``parent`` to inherit its channel mix and seasonality and
+override only what differs.
+
+The merged data is validated and compiled once into a ``Catalog``: name ->
+index dicts for O(1) lookups and read-only verticals x channels /
+objectives x channels arrays. ``get_catalog()`` re-checks the files at most
+every ``CATALOG_CHECK_INTERVAL`` seconds and swaps in a new catalog when they
+change; an invalid edit keeps the last good catalog and is reported in
+``catalog_status()``.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from cortex_data import freeze
+
+CATALOG_DIR = os.environ.get("CORTEX_CATALOG_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog"))
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CORTEX_CATALOG_CHECK_INTERVAL", "2"))
+N_SEASONS = 12
+# Every objective describes its strategy with these fields (shown on the page and in the PDF).
+OBJECTIVE_DETAIL_FIELDS = ("Strategic Imperatives", "KPIs", "Core Audiences", "Messaging Approach")
+# Verticals without their own seasonality (and unknown verticals) follow this one.
+DEFAULT_VERTICAL = "Other"
+
+
+class CatalogError(ValueError):
+    """The catalog files are missing, malformed or inconsistent; ``errors`` lists every problem found."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__("Invalid planning catalog:\n  " + "\n  ".join(self.errors))
+
+
+def catalog_files(directory=CATALOG_DIR):
+    """The base taxonomy followed by the override files, in the order they are applied."""
+    return [os.path.join(directory, "taxonomy.json")] + sorted(glob.glob(os.path.join(directory, "overrides", "*.json")))
+
+
+# -------------------------------
+# MERGE AND VALIDATE
+# -------------------------------
+_SECTIONS = ("channels", "objectives", "verticals")
+_MERGED_FIELDS = ("mix", "adjustments", "details")
+
+
+def _merge(base, override, source, errors):
+    for section in _SECTIONS:
+        entries = override.get(section, [])
+        if not isinstance(entries, list):
+            errors.append(f"{source}: '{section}' must be a list")
+            continue
+        by_name = {entry["name"]: entry for entry in base[section]}
+        seen = set()
+        for entry in entries:
+            name = entry.get("name") if isinstance(entry, dict) else None
+            if not isinstance(name, str) or not name.strip():
+                errors.append(f"{source}: every {section} entry needs a non-empty 'name'")
+                continue
+            if name in seen:
+                errors.append(f"{source}: duplicate {section} entry '{name}'")
+                continue
+            seen.add(name)
+            if name not in by_name:
+                by_name[name] = dict(entry)
+                base[section].append(by_name[name])
+                continue
+            target = by_name[name]
+            for field, value in entry.items():
+                if field in _MERGED_FIELDS and isinstance(value, dict) and isinstance(target.get(field), dict):
+                    target[field] = {**target[field], **value}
+                else:
+                    target[field] = value
+
+
+def _number(value, errors, where, minimum=None, maximum=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        errors.append(f"{where}: expected a number, got {value!r}")
+        return None
+    if minimum is not None and value < minimum:
+        errors.append(f"{where}: {value} is below {minimum:g}")
+        return None
+    if maximum is not None and value > maximum:
+        errors.append(f"{where}: {value} is above {maximum:g}")
+        return None
+    return float(value)
+
+
+def _resolve_verticals(verticals, errors):
+    """Fill each sub-vertical's mix and seasonality from its parent chain."""
+    by_name = {v["name"]: v for v in verticals}
+    resolved = {}
+
+    def resolve(name, chain):
+        if name in resolved:
+            return resolved[name]
+        entry = by_name[name]
+        parent = entry.get("parent")
+        mix, seasonality = entry.get("mix") or {}, entry.get("seasonality")
+        if not isinstance(mix, dict):
+            errors.append(f"vertical '{name}': mix must map channels to weights")
+            mix = {}
+        if parent is not None:
+            if parent not in by_name:
+                errors.append(f"vertical '{name}': unknown parent '{parent}'")
+            elif parent in chain:
+                errors.append(f"vertical '{name}': parent cycle {' -> '.join(chain + [parent])}")
+            else:
+                parent_mix, parent_seasonality = resolve(parent, chain + [parent])
+                mix = {**parent_mix, **mix}
+                seasonality = seasonality if seasonality is not None else parent_seasonality
+        resolved[name] = (mix, seasonality)
+        return resolved[name]
+
+    for v in verticals:
+        resolve(v["name"], [v["name"]])
+    return resolved
+
+
+# -------------------------------
+# COMPILED CATALOG
+# -------------------------------
+class Catalog:
+    """Validated, read-only taxonomy with name -> index dicts and array-backed weights.
+
+    ``mix[v, c]`` is the raw weight of channel ``c`` in vertical ``v`` and
+    ``present[v, c]`` whether the vertical uses it; ``adjustments[o, c]``
+    multiplies the mix for objective ``o``; ``seasonality[v]`` is the
+    January..December demand index.
+    """
+
+    def __init__(self, data, version, sources=()):
+        errors = []
+        self.version = version
+        self.sources = tuple(sources)
+        self.loaded_at = time.time()
+        for section in _SECTIONS:
+            if not data[section]:
+                errors.append(f"'{section}' is empty")
+
+        self.channels = tuple(ch["name"] for ch in data["channels"])
+        self.objectives = tuple(o["name"] for o in data["objectives"])
+        self.verticals = tuple(v["name"] for v in data["verticals"])
+        self.channel_index = {name: i for i, name in enumerate(self.channels)}
+        self.objective_index = {name: i for i, name in enumerate(self.objectives)}
+        self.vertical_index = {name: i for i, name in enumerate(self.verticals)}
+        n_channels = len(self.channels)
+
+        self.saturation = np.ones(n_channels)
+        self.seasonal_sensitivity = np.ones(n_channels)
+        for c, ch in enumerate(data["channels"]):
+            where = f"channel '{ch['name']}'"
+            for field, array in (("saturation", self.saturation), ("seasonal_sensitivity", self.seasonal_sensitivity)):
+                if field in ch:
+                    value = _number(ch[field], errors, f"{where} {field}", minimum=1e-6)
+                    array[c] = value if value is not None else 1.0
+
+        self.adjustments = np.ones((len(self.objectives), n_channels))
+        self.flighting_tilt = np.zeros(len(self.objectives))
+        details = {}
+        for o, objective in enumerate(data["objectives"]):
+            where = f"objective '{objective['name']}'"
+            for ch, factor in (objective.get("adjustments") or {}).items():
+                if ch not in self.channel_index:
+                    errors.append(f"{where}: adjustment for unknown channel '{ch}'")
+                    continue
+                value = _number(factor, errors, f"{where} adjustment '{ch}'", minimum=0)
+                self.adjustments[o, self.channel_index[ch]] = value if value is not None else 1.0
+            tilt = _number(objective.get("flighting_tilt", 0.0), errors, f"{where} flighting_tilt", -1, 1)
+            self.flighting_tilt[o] = tilt or 0.0
+            objective_details = objective.get("details") or {}
+            missing = [f for f in OBJECTIVE_DETAIL_FIELDS if not isinstance(objective_details.get(f), str)]
+            if missing:
+                errors.append(f"{where}: details need text for {', '.join(missing)}")
+            details[objective["name"]] = objective_details
+
+        self.mix = np.zeros((len(self.verticals), n_channels))
+        self.present = np.zeros(self.mix.shape, dtype=bool)
+        self.seasonality = np.ones((len(self.verticals), N_SEASONS))
+        resolved = _resolve_verticals(data["verticals"], errors)
+        for v, name in enumerate(self.verticals):
+            where = f"vertical '{name}'"
+            mix, seasonality = resolved[name]
+            for ch, weight in mix.items():
+                if ch not in self.channel_index:
+                    errors.append(f"{where}: mix weight for unknown channel '{ch}'")
+                    continue
+                value = _number(weight, errors, f"{where} mix '{ch}'", minimum=0)
+                if value is not None:
+                    self.mix[v, self.channel_index[ch]] = value
+                    self.present[v, self.channel_index[ch]] = True
+            if not self.mix[v].any():
+                errors.append(f"{where}: the channel mix needs at least one positive weight")
+            if seasonality is not None:
+                if not isinstance(seasonality, list) or len(seasonality) != N_SEASONS:
+                    errors.append(f"{where}: seasonality must list {N_SEASONS} monthly values")
+                else:
+                    curve = [_number(s, errors, f"{where} seasonality", minimum=1e-6) for s in seasonality]
+                    if None not in curve:
+                        self.seasonality[v] = curve
+        if errors:
+            raise CatalogError(errors)
+
+        # Verticals without a curve of their own follow the default vertical's.
+        default = self.vertical_index.get(DEFAULT_VERTICAL)
+        if default is not None:
+            for v, name in enumerate(self.verticals):
+                if resolved[name][1] is None:
+                    self.seasonality[v] = self.seasonality[default]
+        self._default_vertical = default
+        self.objective_details = freeze(details)
+        self.channel_saturation = freeze(dict(zip(self.channels, self.saturation.tolist())))
+        for array in (self.saturation, self.seasonal_sensitivity, self.adjustments, self.flighting_tilt,
+                      self.mix, self.present, self.seasonality):
+            array.setflags(write=False)
+
+    # O(1) lookups by name; unknown names fall back the way the dict-based data did.
+    def seasonality_curve(self, vertical):
+        v = self.vertical_index.get(vertical, self._default_vertical)
+        return self.seasonality[v] if v is not None else np.ones(N_SEASONS)
+
+    def channel_sensitivity(self, channels):
+        return np.array([self.seasonal_sensitivity[self.channel_index[ch]] if ch in self.channel_index else 1.0
+                         for ch in channels])
+
+    def objective_tilt(self, objective):
+        o = self.objective_index.get(objective)
+        return float(self.flighting_tilt[o]) if o is not None else 0.0
+
+
+def load_catalog(directory=CATALOG_DIR):
+    """Read, merge, validate and compile the catalog files in ``directory``."""
+    errors = []
+    data = {section: [] for section in _SECTIONS}
+    digest = hashlib.sha256()
+    base_version = None
+    sources = []
+    for path in catalog_files(directory):
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            document = json.loads(raw)
+        except OSError as e:
+            errors.append(f"{path}: {e.strerror or e}")
+            continue
+        except ValueError as e:
+            errors.append(f"{path}: not valid JSON ({e})")
+            continue
+        if not isinstance(document, dict):
+            errors.append(f"{path}: expected a JSON object")
+            continue
+        digest.update(raw)
+        version = document.get("version")
+        if not isinstance(version, str) or not version:
+            errors.append(f"{path}: missing 'version'")
+        elif base_version is None:
+            base_version = version
+        sources.append((os.path.basename(path), version))
+        _merge(data, document, os.path.basename(path), errors)
+    if errors:
+        raise CatalogError(errors)
+    # The declared version plus a content hash: any edit to any file yields a new version.
+    return Catalog(data, f"{base_version}+{digest.hexdigest()[:8]}", sources)
+
+# -------------------------------
+# HOT RELOAD (process-wide current catalog)
+# -------------------------------
+class CatalogSource:
+    """The current catalog for a directory, reloaded when its files change."""
+
+    def __init__(self, directory=CATALOG_DIR, check_interval=CATALOG_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.catalog = None
+        self.error = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        signature = []
+        for path in catalog_files(self.directory):
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def current(self):
+        if self.catalog is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self.catalog
+        with self._lock:
+            self._checked_at = time.monotonic()
+            signature = self._file_signature()
+            if signature != self._signature:
+                try:
+                    self.catalog = load_catalog(self.directory)
+                    self.error = None
+                except CatalogError as e:
+                    if self.catalog is None:
+                        raise
+                    self.error = e  # keep serving the last good catalog
+                self._signature = signature
+            return self.catalog
+
+
+_default_source = CatalogSource()
+
+
+def get_catalog():
+    """The process-wide catalog, re-checked against the files at most every few seconds."""
+    return _default_source.current()
+
+
+def catalog_status():
+    catalog = _default_source.catalog
+    return {
+        "version": catalog.version if catalog else None,
+        "sources": [f"{name} ({version})" for name, version in catalog.sources] if catalog else [],
+        "channels": len(catalog.channels) if catalog else 0,
+        "verticals": len(catalog.verticals) if catalog else 0,
+        "objectives": len(catalog.objectives) if catalog else 0,
+        "reload_error": str(_default_source.error) if _default_source.error else None,
+    }
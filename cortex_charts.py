@@ -0,0 +1,196 @@
+"""Chart layer: figures built once from cached layout templates, then patched in place.
+
+A chart object owns one Plotly figure whose traces are created when its
+structure (e.g. the channel list) is first seen; later data changes assign
+the new arrays to the existing traces instead of building a new figure.
+Flighting series longer than ``DISPLAY_POINTS`` are downsampled per channel
+with Largest-Triangle-Three-Buckets, which keeps peaks and troughs, and
+switch to WebGL traces once the chart would draw more than
+``WEBGL_POINT_THRESHOLD`` points. Downsampling is for display only: the
+flighting table and PDF export read the full-resolution plan.
+"""
+import copy
+from functools import lru_cache
+
+import numpy as np
+import plotly.graph_objects as go
+
+from cortex_data import base_colors
+
+# Points per flighting trace on screen; longer series are downsampled.
+DISPLAY_POINTS = 500
+# Points across all flighting traces above which lines are drawn with WebGL (Scattergl).
+WEBGL_POINT_THRESHOLD = 3000
+# Series up to this long are drawn with markers.
+MARKER_POINTS = 60
+
+
+def lttb_indices(values, n_out):
+    """Indices of ``n_out`` points per row chosen by Largest-Triangle-Three-Buckets.
+
+    ``values`` is rows x n, sampled at evenly spaced x. The first and last
+    points are always kept; each bucket in between keeps the point forming the
+    largest triangle with the previously kept point and the next bucket's mean.
+    All rows are processed together, one vectorized step per bucket.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    rows, n = values.shape
+    if n_out >= n or n_out < 3:
+        return np.broadcast_to(np.arange(n), (rows, n))
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty((rows, n_out), dtype=np.intp)
+    selected[:, 0], selected[:, -1] = 0, n - 1
+    all_rows = np.arange(rows)
+    prev_x, prev_y = np.zeros(rows), values[:, 0]
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        if b + 2 >= len(edges):
+            next_x, next_y = float(n - 1), values[:, -1]
+        else:
+            next_x, next_y = (end + next_end - 1) / 2, values[:, end:next_end].mean(axis=1)
+        x = np.arange(start, end)
+        # Twice the triangle area, up to sign.
+        area = np.abs((prev_x[:, None] - next_x) * (values[:, start:end] - prev_y[:, None])
+                      - (prev_x[:, None] - x) * (next_y - prev_y)[:, None])
+        best = start + area.argmax(axis=1)
+        selected[:, b + 1] = best
+        prev_x, prev_y = best.astype(float), values[all_rows, best]
+    return selected
+
+
+# -------------------------------
+# LAYOUT TEMPLATES (validated once per process, deep-copied into each new figure)
+# -------------------------------
+@lru_cache(maxsize=None)
+def layout_template(kind):
+    if kind == "pie":
+        return go.Layout(margin=dict(t=60, b=20, l=20, r=20), legend=dict(orientation="v"))
+    if kind == "frontier":
+        return go.Layout(
+            title="Efficient Frontier (response index; static mix at reference budget = 100)",
+            xaxis_title="Total Investment ($)", yaxis_title="Response Index", xaxis=dict(tickprefix="$"),
+        )
+    if kind == "flighting":
+        return go.Layout(
+            yaxis=dict(title="Investment ($)", tickprefix="$"),
+            xaxis=dict(type="category", categoryorder="array"),
+            yaxis2=dict(title="Total Investment ($)", tickprefix="$", overlaying="y", side="right",
+                        rangemode="tozero", visible=False),
+        )
+    raise ValueError(f"Unknown chart template: {kind}")
+
+
+def _figure(kind, traces):
+    return go.Figure(data=traces, layout=copy.deepcopy(layout_template(kind)))
+
+
+class _Chart:
+    """A figure plus the key of the data it currently shows; ``update`` patches only on a new key."""
+
+    def __init__(self, figure):
+        self.figure = figure
+        self.key = None
+
+    def update(self, key, *args, **kwargs):
+        """Show the data for ``key``; returns True if the figure was patched."""
+        if key == self.key:
+            return False
+        with self.figure.batch_update():
+            self._patch(*args, **kwargs)
+        self.key = key
+        return True
+
+    def _patch(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+class PieChart(_Chart):
+    def __init__(self):
+        super().__init__(_figure("pie", [go.Pie()]))
+
+    def _patch(self, allocation, title):
+        pie = self.figure.data[0]
+        pie.labels = list(allocation)
+        pie.values = list(allocation.values())
+        pie.marker.colors = [base_colors[i % len(base_colors)] for i in range(len(allocation))]
+        self.figure.layout.title.text = title
+
+
+class FrontierChart(_Chart):
+    def __init__(self):
+        super().__init__(_figure("frontier", [
+            go.Scatter(mode="lines", name="Optimal split"),
+            go.Scatter(mode="markers", name="Selected budget", marker=dict(size=12)),
+            go.Scatter(mode="markers", name="Current allocation", marker=dict(size=12, symbol="diamond")),
+        ]))
+
+    def _patch(self, frontier):
+        line = self.figure.data[0]
+        line.x, line.y = frontier.budgets, frontier.response
+
+    def set_points(self, budget, optimum, current_budget, current_response):
+        """Move the two markers (e.g. on every budget slider change) without touching the frontier line."""
+        selected, current = self.figure.data[1], self.figure.data[2]
+        with self.figure.batch_update():
+            selected.x, selected.y = [budget], [optimum]
+            current.x, current.y = [current_budget], [current_response]
+
+
+# Simulated total-spend bands: (percentile row, name, fill opacity or None for the median line).
+_BANDS = ((4, None, None), (0, "Total 5-95th pct", 0.12), (3, None, None), (1, "Total 25-75th pct", 0.22),
+          (2, "Total median (simulated)", None))
+
+
+class FlightingChart(_Chart):
+    """Investment per period per channel, with optional simulated bands on a secondary axis."""
+
+    def __init__(self, channels, webgl=False):
+        trace_type = go.Scattergl if webgl else go.Scatter
+        traces = []
+        for row, name, opacity in _BANDS:
+            if name is None:
+                traces.append(go.Scatter(mode="lines", line=dict(width=0), yaxis="y2", showlegend=False,
+                                         hoverinfo="skip", visible=False))
+            elif opacity is not None:
+                traces.append(go.Scatter(mode="lines", line=dict(width=0), fill="tonexty", yaxis="y2", name=name,
+                                         fillcolor=f"rgba(99,110,250,{opacity})", visible=False))
+            else:
+                traces.append(go.Scatter(mode="lines", yaxis="y2", name=name, visible=False,
+                                         line=dict(color="rgba(99,110,250,0.9)", dash="dot")))
+        traces.extend(trace_type(name=ch) for ch in channels)
+        super().__init__(_figure("flighting", traces))
+        self.channels = list(channels)
+        self.webgl = webgl
+        self.displayed_points = self.total_points = 0
+
+    @staticmethod
+    def use_webgl(n_channels, n_periods):
+        return n_channels * min(n_periods, DISPLAY_POINTS) > WEBGL_POINT_THRESHOLD
+
+    def _patch(self, labels, matrix, granularity, simulation=None):
+        labels = np.asarray(labels, dtype=object)
+        n = len(labels)
+        indices = lttb_indices(matrix, DISPLAY_POINTS)
+        mode = "lines+markers" if n <= MARKER_POINTS else "lines"
+        layout = self.figure.layout
+        layout.title.text = f"{granularity} Investment by Channel (Dynamic Flighting)"
+        layout.xaxis.title.text = granularity
+        # Plain lists: string arrays validate faster but serialize (on every rerun) slower.
+        layout.xaxis.categoryarray = labels.tolist()
+        layout.yaxis2.visible = simulation is not None
+        band_traces, channel_traces = self.figure.data[:len(_BANDS)], self.figure.data[len(_BANDS):]
+        for trace, row, idx in zip(channel_traces, matrix, indices):
+            trace.x, trace.y, trace.mode = labels[idx].tolist(), row[idx], mode
+        if simulation is not None:
+            # One index set for every band, so the filled areas stay aligned.
+            band_idx = lttb_indices(simulation.spend_bands[2], DISPLAY_POINTS)[0]
+            band_labels = labels[band_idx].tolist()
+            for trace, (row, _, _) in zip(band_traces, _BANDS):
+                trace.x, trace.y, trace.visible = band_labels, simulation.spend_bands[row][band_idx], True
+        else:
+            for trace in band_traces:
+                trace.visible = False
+        self.total_points = n
+        self.displayed_points = indices.shape[1]
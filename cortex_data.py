@@ -0,0 +1,26 @@
+"""Static planning constants: response-curve reference budget and chart colors.
+
+The channel / vertical / objective taxonomy lives in versioned data files
+(see cortex_catalog). Everything here is built once per process, when the
+module is first imported, and shared by every session; tables are frozen
+(read-only mappings and tuples) so no session can change them under another.
+"""
+from types import MappingProxyType
+
+
+def freeze(value):
+    """Read-only deep copy of nested dicts and lists: mappingproxy and tuple."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+# Budget at which the optimal split reproduces each vertical's catalog channel mix.
+response_reference_budget = 150000
+
+base_colors = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A', '#19D3F3',
+               '#FF6692', '#B6E880', '#FF97FF', '#FECB52', '#1f77b4', '#ff7f0e']
+
+base_colors = freeze(base_colors)
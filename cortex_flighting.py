@@ -0,0 +1,156 @@
+"""Local seasonal flighting engine: instant, deterministic, no network.
+
+Spend is computed per calendar day as one channels x days array and rolled
+up to weekly, broadcast-month or calendar-month periods on demand.
+"""
+import numpy as np
+
+from cortex_catalog import get_catalog
+
+GRANULARITIES = ("Calendar Month", "Broadcast Month", "Weekly", "Daily")
+
+
+# -------------------------------
+# CALENDAR PERIODS
+# -------------------------------
+def campaign_days(start, end):
+    """Every calendar day from ``start`` to ``end`` inclusive (at least one day)."""
+    start = np.datetime64(start, "D")
+    end = max(np.datetime64(end, "D"), start)
+    return np.arange(start, end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+
+
+def _weekday(days):
+    # Monday = 0; 1970-01-01 was a Thursday.
+    return (days.astype("int64") + 3) % 7
+
+
+def period_keys(days, granularity):
+    """Map each day to the first day (or month) of the period it falls in."""
+    if granularity == "Daily":
+        return days
+    if granularity == "Weekly":
+        return days - _weekday(days).astype("timedelta64[D]")
+    if granularity == "Calendar Month":
+        return days.astype("datetime64[M]")
+    if granularity == "Broadcast Month":
+        # Broadcast weeks run Monday-Sunday and belong to the month their Sunday falls in.
+        week_end = days + (6 - _weekday(days)).astype("timedelta64[D]")
+        return week_end.astype("datetime64[M]")
+    raise ValueError(f"Unknown flighting granularity: {granularity}")
+
+
+def period_bounds(days, granularity):
+    """Return (index of each period's first day, period keys)."""
+    keys = period_keys(days, granularity)
+    if len(keys) == 0:
+        return np.array([], dtype=np.intp), keys
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, keys[starts]
+
+
+def period_labels(keys, granularity):
+    if granularity == "Daily":
+        return [str(k) for k in keys]
+    if granularity == "Weekly":
+        return [f"Wk of {k}" for k in keys]
+    labels = [k.item().strftime("%b %Y") for k in keys.astype("datetime64[M]")]
+    if granularity == "Broadcast Month":
+        labels = [f"{label} (Bcst)" for label in labels]
+    return labels
+
+
+def count_periods(start, end, granularity):
+    return len(period_bounds(campaign_days(start, end), granularity)[0])
+
+
+# -------------------------------
+# DAILY SEASONAL WEIGHTS
+# -------------------------------
+def seasonal_daily_weights(channels, days, vertical, top_priority):
+    """Unnormalized channels x days weights from the catalog's seasonality curves and objective tilt."""
+    catalog = get_catalog()
+    demand = catalog.seasonality_curve(vertical)[days.astype("datetime64[M]").astype("int64") % 12]
+
+    sensitivity = catalog.channel_sensitivity(channels).reshape(-1, 1)
+    weights = demand[np.newaxis, :] ** sensitivity
+
+    tilt = catalog.objective_tilt(top_priority)
+    if len(days) > 1 and tilt:
+        position = np.linspace(-1.0, 1.0, len(days))
+        weights = weights * (1.0 - tilt * position)[np.newaxis, :]
+    return weights
+
+
+def _apply_monthly_patterns(weights, days, channels, monthly_patterns):
+    # Rescale each overridden channel so its calendar-month totals follow the given
+    # percentages while keeping the seasonal day-to-day shape within each month.
+    starts, _ = period_bounds(days, "Calendar Month")
+    n_months = len(starts)
+    rows = [i for i, ch in enumerate(channels) if len(monthly_patterns.get(ch) or []) == n_months]
+    if not rows:
+        return weights
+    target = np.array([monthly_patterns[channels[i]] for i in rows], dtype=float)
+    target = target / np.where(target.sum(axis=1, keepdims=True) > 0, target.sum(axis=1, keepdims=True), 1.0)
+    baseline = np.add.reduceat(weights[rows], starts, axis=1)
+    baseline = baseline / baseline.sum(axis=1, keepdims=True)
+    scale = np.divide(target, baseline, out=np.zeros_like(target), where=baseline > 0)
+    month_of_day = np.repeat(np.arange(n_months), np.diff(np.r_[starts, len(days)]))
+    weights = weights.copy()
+    weights[rows] = weights[rows] * scale[:, month_of_day]
+    return weights
+
+
+# -------------------------------
+# FLIGHTING PLAN (channels x days dollars, rolled up on demand)
+# -------------------------------
+class FlightingPlan:
+    def __init__(self, channels, days, values):
+        self.channels = list(channels)
+        self.days = days
+        self.values = values
+        self._rollups = {}
+
+    @classmethod
+    def build(cls, channels, budgets, start, end, vertical, top_priority, monthly_patterns=None):
+        """Spread each channel's budget over the campaign's calendar days.
+
+        ``monthly_patterns`` optionally maps channels to one percentage per
+        calendar month (e.g. AI-refined flighting); other channels keep the
+        seasonal baseline.
+        """
+        days = campaign_days(start, end)
+        weights = seasonal_daily_weights(channels, days, vertical, top_priority)
+        if monthly_patterns:
+            weights = _apply_monthly_patterns(weights, days, list(channels), monthly_patterns)
+        totals = weights.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        budgets = np.asarray(budgets, dtype=float).reshape(-1, 1)
+        return cls(channels, days, weights / totals * budgets)
+
+    def rollup(self, granularity):
+        """Return (period keys, channels x periods dollars); cached per granularity."""
+        if granularity not in self._rollups:
+            starts, keys = period_bounds(self.days, granularity)
+            if self.values.shape[0]:
+                matrix = np.add.reduceat(self.values, starts, axis=1)
+            else:
+                matrix = np.zeros((0, len(starts)))
+            self._rollups[granularity] = (keys, matrix)
+        return self._rollups[granularity]
+
+    def labels(self, granularity):
+        return period_labels(self.rollup(granularity)[0], granularity)
+
+    def totals(self):
+        return self.values.sum(axis=1)
+
+    def to_frame(self, granularity):
+        """Channels x periods table with a leading total column, values in dollars."""
+        import pandas as pd
+
+        _, matrix = self.rollup(granularity)
+        frame = pd.DataFrame(matrix, index=pd.Index(self.channels, name="Channel"),
+                             columns=self.labels(granularity))
+        frame.insert(0, "Total Investment ($)", self.totals())
+        return frame
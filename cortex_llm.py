@@ -0,0 +1,414 @@
+"""Shared LLM client: pooled connections, a process-wide rate limit and a circuit breaker.
+
+All chat completions go through one ``LLMClient`` per process. It spaces
+requests with a token bucket shared by every session, and a circuit breaker
+fails calls immediately while the provider is unhealthy instead of letting
+every rerun wait for a timeout. The backend is pluggable:
+
+* ``openai`` (default): the OpenAI API over a keep-alive connection pool.
+* ``stub``: offline and deterministic, for development, demos and benchmarks.
+
+Configured with ``CORTEX_LLM_BACKEND``, ``CORTEX_LLM_RATE`` (requests per
+second), ``CORTEX_LLM_BURST``, ``CORTEX_LLM_FAILURE_THRESHOLD`` and
+``CORTEX_LLM_RESET_TIMEOUT`` (seconds).
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from cortex_metrics import record_llm_call
+from cortex_retrieval import estimate_tokens
+
+LLM_BACKEND = os.environ.get("CORTEX_LLM_BACKEND", "openai")
+LLM_RATE = float(os.environ.get("CORTEX_LLM_RATE", "5"))
+LLM_BURST = int(os.environ.get("CORTEX_LLM_BURST", "10"))
+LLM_FAILURE_THRESHOLD = int(os.environ.get("CORTEX_LLM_FAILURE_THRESHOLD", "5"))
+LLM_RESET_TIMEOUT = float(os.environ.get("CORTEX_LLM_RESET_TIMEOUT", "30"))
+LLM_MAX_QUEUE_WAIT = 10.0
+
+Completion = namedtuple("Completion", "text prompt_tokens completion_tokens")
+
+
+class LLMUnavailableError(RuntimeError):
+    """The request was refused locally (circuit open or rate limit queue full); retrying now is pointless."""
+
+    retryable = False
+
+# -------------------------------
+# RATE LIMITING AND CIRCUIT BREAKING
+# -------------------------------
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` requests per second with bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available; otherwise return the seconds until one will be."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _deadline_wait(self, deadline):
+        wait = self._take()
+        if wait and time.monotonic() + wait > deadline:
+            raise LLMUnavailableError("LLM rate limit: too many queued requests, try again shortly")
+        return wait
+
+    def acquire(self, timeout=LLM_MAX_QUEUE_WAIT):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._deadline_wait(deadline)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=LLM_MAX_QUEUE_WAIT):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._deadline_wait(deadline)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def available(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.capacity, self._tokens + elapsed * self.rate)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive provider failures and rejects calls for
+    ``reset_timeout`` seconds; then lets a single probe through to decide whether to close again."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise LLMUnavailableError(f"LLM provider unavailable; retrying in {remaining:.0f}s")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise LLMUnavailableError("LLM provider unavailable; checking whether it has recovered")
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that neither succeeded nor failed on the provider side (e.g. a rejected prompt)."""
+        with self._lock:
+            self._probing = False
+
+# -------------------------------
+# BACKENDS
+# -------------------------------
+class OpenAIBackend:
+    """OpenAI chat completions over pooled keep-alive connections."""
+
+    name = "openai"
+
+    def __init__(self, api_key=None, api_base=None, pool_size=32):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.pool_size = pool_size
+        self._openai_module = None
+        self._setup_lock = threading.Lock()
+        self._aiohttp = None  # (event loop, aiohttp.ClientSession)
+
+    @property
+    def _openai(self):
+        # openai (and the aiohttp it pulls in) is imported on the first call, not at startup.
+        if self._openai_module is None:
+            with self._setup_lock:
+                if self._openai_module is None:
+                    self._openai_module = self._setup()
+        return self._openai_module
+
+    def _setup(self):
+        import openai
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        class PooledSession(requests.Session):
+            # The openai library recycles its per-thread session every few minutes by closing it;
+            # the pool is owned here instead, so keep the connections open.
+            def close(self):
+                pass
+
+        self._session = PooledSession()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        openai.requestssession = self._session
+        return openai
+
+    def warm(self, connect=False):
+        """Import the client library and set up the pool; with ``connect``, also open one connection."""
+        openai = self._openai
+        if connect:
+            base = self.api_base or openai.api_base
+            self._session.head(base, timeout=5)
+
+    def _params(self, model, messages, max_tokens, temperature, timeout):
+        params = dict(model=model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+                      request_timeout=timeout)
+        api_key = self.api_key or os.environ.get("OPENAI_API_KEY")
+        if api_key:
+            params["api_key"] = api_key
+        if self.api_base:
+            params["api_base"] = self.api_base
+        return params
+
+    @staticmethod
+    def _completion(response):
+        usage = response.get("usage") or {}
+        return Completion(response.choices[0].message.content.strip(), usage.get("prompt_tokens"),
+                          usage.get("completion_tokens"))
+
+    def is_client_error(self, exc):
+        # A rejected prompt says nothing about provider health.
+        return isinstance(exc, self._openai.error.InvalidRequestError)
+
+    def complete(self, model, messages, max_tokens, temperature, timeout):
+        return self._completion(
+            self._openai.ChatCompletion.create(**self._params(model, messages, max_tokens, temperature, timeout))
+        )
+
+    def stream(self, model, messages, max_tokens, temperature, timeout, cancel_event):
+        response = self._openai.ChatCompletion.create(
+            stream=True, **self._params(model, messages, max_tokens, temperature, timeout)
+        )
+        try:
+            for chunk in response:
+                if cancel_event.is_set():
+                    break
+                delta = chunk.choices[0].delta.get("content")
+                if delta:
+                    yield delta
+        finally:
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+
+    async def acomplete(self, model, messages, max_tokens, temperature, timeout):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._aiohttp is None or self._aiohttp[0] is not loop or self._aiohttp[1].closed:
+            self._aiohttp = (loop, aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64)))
+        token = self._openai.aiosession.set(self._aiohttp[1])
+        try:
+            response = await self._openai.ChatCompletion.acreate(
+                **self._params(model, messages, max_tokens, temperature, timeout)
+            )
+        finally:
+            self._openai.aiosession.reset(token)
+        return self._completion(response)
+
+    async def aclose(self):
+        if self._aiohttp is not None:
+            await self._aiohttp[1].close()
+            self._aiohttp = None
+
+
+def offline_response(messages):
+    """Deterministic stand-in text: JSON prompts get an empty object, others an offline notice."""
+    prompt = messages[-1]["content"]
+    if "Return only valid JSON" in prompt:
+        return "{}"
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    return (
+        "TLDR: Offline draft generated without the AI service; review the channel mix and flighting above.\n\n"
+        f"This summary was produced by the local stand-in backend (request {digest}). Configure "
+        "CORTEX_LLM_BACKEND=openai with a valid API key for a full AI-generated plan."
+    )
+
+
+class StubBackend:
+    """Offline backend: instant, deterministic responses from ``responder(messages)``."""
+
+    name = "stub"
+
+    def __init__(self, responder=offline_response, latency=0.0):
+        self.responder = responder
+        self.latency = latency
+
+    def is_client_error(self, exc):
+        return False
+
+    def complete(self, model, messages, max_tokens, temperature, timeout):
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.responder(messages)
+        return Completion(text, sum(estimate_tokens(m["content"]) for m in messages), estimate_tokens(text))
+
+    def stream(self, model, messages, max_tokens, temperature, timeout, cancel_event):
+        for word in self.complete(model, messages, max_tokens, temperature, timeout).text.split(" "):
+            if cancel_event.is_set():
+                break
+            yield word + " "
+
+    async def acomplete(self, model, messages, max_tokens, temperature, timeout):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.complete(model, messages, max_tokens, temperature, timeout)
+
+    def warm(self, connect=False):
+        pass
+
+    async def aclose(self):
+        pass
+
+# -------------------------------
+# CLIENT
+# -------------------------------
+class LLMClient:
+    """Rate-limited, circuit-broken access to a backend; records latency and token usage per call."""
+
+    def __init__(self, backend, rate_limiter=None, breaker=None, max_queue_wait=LLM_MAX_QUEUE_WAIT):
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.max_queue_wait = max_queue_wait
+
+    def _failed(self, exc):
+        if self.backend.is_client_error(exc):
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+
+    def complete(self, messages, model, max_tokens, temperature=0.7, timeout=60, purpose="completion"):
+        self.breaker.before_call()
+        start = time.perf_counter()
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.max_queue_wait)
+            completion = self.backend.complete(model, messages, max_tokens, temperature, timeout)
+        except LLMUnavailableError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._failed(e)
+            record_llm_call(purpose, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        self.breaker.record_success()
+        record_llm_call(purpose, time.perf_counter() - start, completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    def stream(self, messages, model, max_tokens, temperature=0.7, timeout=60, cancel_event=None, purpose="stream"):
+        """Yield text deltas. Streams carry no usage block, so token counts are estimated."""
+        cancel_event = cancel_event or threading.Event()
+        self.breaker.before_call()
+        start = time.perf_counter()
+        received, error = [], None
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.max_queue_wait)
+            for delta in self.backend.stream(model, messages, max_tokens, temperature, timeout, cancel_event):
+                received.append(delta)
+                yield delta
+        except LLMUnavailableError as e:
+            error = type(e).__name__
+            self.breaker.release()
+            raise
+        except Exception as e:
+            error = type(e).__name__
+            self._failed(e)
+            raise
+        finally:
+            if error is None:
+                self.breaker.record_success()
+            record_llm_call(
+                purpose, time.perf_counter() - start, sum(estimate_tokens(m["content"]) for m in messages),
+                estimate_tokens("".join(received)), error=error,
+            )
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.7, timeout=60, purpose="completion"):
+        self.breaker.before_call()
+        start = time.perf_counter()
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(self.max_queue_wait)
+            completion = await asyncio.wait_for(
+                self.backend.acomplete(model, messages, max_tokens, temperature, timeout), timeout
+            )
+        except LLMUnavailableError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._failed(e)
+            record_llm_call(purpose, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        self.breaker.record_success()
+        record_llm_call(purpose, time.perf_counter() - start, completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    def warm(self, connect=False):
+        """Load the backend ahead of the first call (see ``OpenAIBackend.warm``)."""
+        self.backend.warm(connect)
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rate_limit_tokens": round(self.rate_limiter.available(), 2) if self.rate_limiter else None,
+        }
+
+
+def make_backend(name=LLM_BACKEND, **kwargs):
+    if name == "openai":
+        return OpenAIBackend(**kwargs)
+    if name == "stub":
+        return StubBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend {name!r} (expected 'openai' or 'stub')")
+
+
+@lru_cache(maxsize=1)
+def get_llm_client():
+    """The process-wide client; its rate limit and circuit breaker are shared by every session."""
+    return LLMClient(
+        make_backend(),
+        rate_limiter=TokenBucket(LLM_RATE, LLM_BURST),
+        breaker=CircuitBreaker(LLM_FAILURE_THRESHOLD, LLM_RESET_TIMEOUT),
+    )
@@ -0,0 +1,180 @@
+"""Per-session memory accounting for large artifacts: figures, flighting matrices, simulations and PDFs.
+
+Each session keeps its reusable artifacts in a ``SessionMemory``. The size of
+an artifact is estimated once, when it is stored, and the session is held to
+a cap per category and a cap overall: past a cap, the least recently used
+artifacts are dropped and simply rebuilt if they are needed again. Every
+live ``SessionMemory`` is registered process-wide, so ``memory_report`` can
+show what each session holds.
+"""
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from plotly.basedatatypes import BaseFigure
+
+MB = 1024 * 1024
+SESSION_MEMORY_LIMIT = int(float(os.environ.get("CORTEX_SESSION_MEMORY_MB", "64")) * MB)
+CATEGORY_LIMITS = {
+    "figure": 24 * MB,
+    "flighting": 24 * MB,
+    "simulation": 16 * MB,
+    "pdf": 8 * MB,
+}
+
+
+def estimate_size(value, _seen=None):
+    """Approximate bytes held by ``value``, counting shared objects once."""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    # Only consult pandas once something has imported it; a frame cannot exist before that.
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, BaseFigure):
+        # The figure's own trace and layout dicts; to_dict() would deep-copy them first.
+        return estimate_size(value._data, seen) + estimate_size(value._layout, seen)
+    if isinstance(value, Future):
+        done = value.done() and not value.cancelled() and value.exception() is None
+        return estimate_size(value.result(), seen) if done else 0
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, seen) for v in value)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        size += estimate_size(vars(value), seen)
+    return size
+
+
+class _Entry:
+    __slots__ = ("key", "value", "category", "size", "created_at")
+
+    def __init__(self, key, value, category):
+        self.key = key
+        self.value = value
+        self.category = category
+        self.size = None
+        self.created_at = time.time()
+
+    def resolve_size(self):
+        # Futures are sized once their result is in; everything else on first use.
+        if self.size is None:
+            size = estimate_size(self.value)
+            if not isinstance(self.value, Future) or self.value.done():
+                self.size = size
+            return size
+        return self.size
+
+
+class SessionMemory:
+    """One session's artifacts, evicted least-recently-used first to stay within the caps."""
+
+    def __init__(self, session_id, limit=SESSION_MEMORY_LIMIT, category_limits=CATEGORY_LIMITS):
+        self.session_id = session_id
+        self.limit = limit
+        self.category_limits = dict(category_limits)
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # The script thread and Streamlit's download thread both store artifacts.
+        self._lock = threading.Lock()
+        _sessions[session_id] = self
+
+    def get(self, name, key):
+        """The artifact stored as ``name`` if it was built for ``key``, else None."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.key != key:
+                return None
+            self._entries.move_to_end(name)
+            return entry
+
+    def put(self, name, key, value, category="other"):
+        with self._lock:
+            entry = self._entries[name] = _Entry(key, value, category)
+            self._entries.move_to_end(name)
+            self._enforce(keep=name)
+            return entry
+
+    def _enforce(self, keep):
+        sizes = {name: entry.resolve_size() for name, entry in self._entries.items()}
+        by_category = {}
+        for name, entry in self._entries.items():
+            by_category[entry.category] = by_category.get(entry.category, 0) + sizes[name]
+        total = sum(sizes.values())
+        for name in list(self._entries):
+            if name == keep:
+                continue
+            entry = self._entries[name]
+            over_category = by_category[entry.category] > self.category_limits.get(entry.category, self.limit)
+            if total <= self.limit and not over_category:
+                continue
+            del self._entries[name]
+            by_category[entry.category] -= sizes[name]
+            total -= sizes[name]
+            self.evictions += 1
+
+    def refresh(self, name):
+        """Re-measure ``name`` after it was changed in place, evicting others if it grew past a cap."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.size = None
+                self._enforce(keep=name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def usage(self):
+        """Bytes held now: total, per category and per artifact (largest first)."""
+        with self._lock:
+            entries = [(name, entry.category, entry.resolve_size()) for name, entry in self._entries.items()]
+        by_category = {}
+        for _, category, size in entries:
+            by_category[category] = by_category.get(category, 0) + size
+        return {
+            "session_id": self.session_id,
+            "total_bytes": sum(size for _, _, size in entries),
+            "limit_bytes": self.limit,
+            "by_category": by_category,
+            "artifacts": sorted(({"name": name, "category": category, "bytes": size}
+                                 for name, category, size in entries), key=lambda a: -a["bytes"]),
+            "evictions": self.evictions,
+        }
+
+# -------------------------------
+# PROCESS-WIDE VIEW
+# -------------------------------
+# Weak references: a session's memory disappears from the report when Streamlit drops its state.
+_sessions = weakref.WeakValueDictionary()
+
+
+def process_rss():
+    """Resident set size of this process in bytes (Linux), or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_report():
+    """Tracked artifact memory per live session, largest first, with the process RSS."""
+    sessions = sorted((memory.usage() for memory in list(_sessions.values())), key=lambda u: -u["total_bytes"])
+    return {
+        "process_rss_bytes": process_rss(),
+        "sessions": len(sessions),
+        "tracked_bytes": sum(u["total_bytes"] for u in sessions),
+        "per_session": [{k: u[k] for k in ("session_id", "total_bytes", "by_category", "evictions")}
+                        for u in sessions],
+    }
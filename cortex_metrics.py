@@ -0,0 +1,112 @@
+"""Opt-in rerun profiling: stage timings, LLM call latency/tokens and cache hits.
+
+Enable with ``CORTEX_PROFILE=1`` (or ``?profile=1`` in the app URL). Set
+``CORTEX_METRICS_PATH`` to also append one JSON line per run for tooling.
+Each LLM call is tagged with the session it was made for (a context
+variable that the worker pools carry over), so a run only reports its own
+session's calls even when several sessions share the process.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PROFILE_ENABLED = os.environ.get("CORTEX_PROFILE", "") not in ("", "0")
+METRICS_PATH = os.environ.get("CORTEX_METRICS_PATH")
+
+_llm_calls = deque(maxlen=500)
+_llm_calls_lock = threading.Lock()
+_sequence = itertools.count(1)
+# The session code runs on behalf of; set per script run and copied into the pools that make LLM calls.
+current_session = contextvars.ContextVar("cortex_session", default=None)
+
+
+def record_llm_call(kind, latency, prompt_tokens=None, completion_tokens=None, cached=False, error=None):
+    """Log one LLM request (or cache hit); safe to call from worker threads."""
+    call = {
+        "seq": next(_sequence), "at": time.time(), "kind": kind, "latency_ms": round(latency * 1000, 2),
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cached": cached,
+        "error": error, "session": current_session.get(),
+    }
+    with _llm_calls_lock:
+        _llm_calls.append(call)
+
+
+def recent_llm_calls(since_seq=0, session=None):
+    """Calls after ``since_seq``, only those made for ``session`` unless it is None (process-wide)."""
+    with _llm_calls_lock:
+        return [call for call in _llm_calls
+                if call["seq"] > since_seq and (session is None or call["session"] == session)]
+
+
+def _last_sequence():
+    with _llm_calls_lock:
+        return _llm_calls[-1]["seq"] if _llm_calls else 0
+
+
+class RunMetrics:
+    """Stage timings for one script run; a no-op unless ``enabled``."""
+
+    def __init__(self, enabled=PROFILE_ENABLED, session_id=None):
+        self.enabled = enabled
+        self.session_id = session_id
+        if session_id is not None:
+            current_session.set(session_id)
+        self.started_at = time.time()
+        self.stages = {}
+        self._start = time.perf_counter()
+        self._last_checkpoint = self._start
+        self._first_llm_seq = _last_sequence()
+
+    def checkpoint(self, name):
+        """Attribute the time since the previous checkpoint (or run start) to stage ``name``."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last_checkpoint) * 1000
+        self._last_checkpoint = now
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def llm_calls(self):
+        """LLM calls for this run's session that finished since it started (process-wide without a session)."""
+        return recent_llm_calls(self._first_llm_seq, self.session_id)
+
+    def to_dict(self, **extra):
+        calls = self.llm_calls()
+        summary = {
+            "started_at": self.started_at,
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 2),
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+            "llm": {
+                "calls": len(calls),
+                "cache_hits": sum(1 for c in calls if c["cached"]),
+                "latency_ms": round(sum(c["latency_ms"] for c in calls if not c["cached"]), 2),
+                "prompt_tokens": sum(c["prompt_tokens"] or 0 for c in calls),
+                "completion_tokens": sum(c["completion_tokens"] or 0 for c in calls),
+            },
+            "llm_calls": calls,
+        }
+        summary.update(extra)
+        return summary
+
+    def dump(self, path=METRICS_PATH, **extra):
+        """Append this run's metrics as one JSON line to ``path``; returns the dict."""
+        data = self.to_dict(**extra)
+        if path:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(data, default=str) + "\n")
+        return data
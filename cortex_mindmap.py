@@ -1,16 +1,30 @@
 import streamlit as st
-import plotly.graph_objects as go
 import math
-import pandas as pd
-from fpdf import FPDF
 import io
-import openai
 import os
 import datetime
-import json
-
-# Load API key from Streamlit Cloud secrets (do not print the full key)
-openai.api_key = st.secrets.get("OPENAI_API_KEY")
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from cortex_allocation import compute_normalized_allocation
+from cortex_cache import get_llm_cache, make_cache_key
+from cortex_charts import FlightingChart, FrontierChart, PieChart
+from cortex_catalog import OBJECTIVE_DETAIL_FIELDS, catalog_status, get_catalog
+from cortex_flighting import GRANULARITIES, FlightingPlan, count_periods
+from cortex_llm import get_llm_client
+from cortex_memory import SessionMemory, memory_report
+from cortex_metrics import PROFILE_ENABLED, RunMetrics
+from cortex_optimizer import get_budget_optimizer
+from cortex_orchestrator import LLMOrchestrator
+from cortex_planning import (FLIGHTING_TIMEOUT, PLAN_MODEL, PLAN_TIMEOUT, build_base_plan_summary,
+                             build_full_plan_messages, generate_flighting_patterns, stream_full_plan)
+from cortex_report import build_report, render_report_cached, report_fingerprint
+from cortex_simulation import SIMULATION_SCENARIOS, simulate_plan_cached
+from cortex_store import get_plan_store
+
+# Load API key from Streamlit Cloud secrets (do not print the full key). Passed through the
+# environment: the openai library itself is only imported on the first AI call.
+if st.secrets.get("OPENAI_API_KEY"):
+    os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 
 # -------------------------------
 # CUSTOM CSS FOR VISUAL APPEAL & POINTER CURSOR
@@ -49,128 +63,61 @@ st.markdown(
 )
 
 # -------------------------------
-# DATA STRUCTURES
-# -------------------------------
-objectives = {
-    "Awareness": {
-        "Strategic Imperatives": "Prioritize reach and frequency",
-        "KPIs": "Brand Lift, % Reach, Frequency",
-        "Core Audiences": "Influencers and early adopters, Interest-based prospecting",
-        "Messaging Approach": "Emotional storytelling"
-    },
-    "Growth": {
-        "Strategic Imperatives": "Maximize purchase volume",
-        "KPIs": "Customer acquisition costs (CAC), Sales volume",
-        "Core Audiences": "Category buyers, Lookalikes",
-        "Messaging Approach": "Highlight key value propositions"
-    },
-    "Profitability": {
-        "Strategic Imperatives": "Optimize for high margin products and high LTV consumers",
-        "KPIs": "LTV/CAC ratio, Incremental sales lift, Marginal ROI",
-        "Core Audiences": "Cart abandoners, 1P CRM segments",
-        "Messaging Approach": "Upselling and cross-selling"
-    },
-    "Buy Rate": {
-        "Strategic Imperatives": "Increase purchase frequency",
-        "KPIs": "Repeat purchase rate, Customer retention",
-        "Core Audiences": "Existing brand buyers, Lapsed brand buyers",
-        "Messaging Approach": "Personalized recommendations and loyalty incentives"
-    },
-    "Household Penetration": {
-        "Strategic Imperatives": "Grow the customer base",
-        "KPIs": "Household penetration %, New to brand sales",
-        "Core Audiences": "Competitor buyers, New life stage consumers",
-        "Messaging Approach": "Problem-solution framing to appeal to new users"
-    }
-}
-
-vertical_channel_mix = {
-    "Other": {"Retail Media": 20, "Paid Search": 20, "Paid Social": 20, "Linear TV": 20,
-              "Programmatic Display": 20, "Connected TV": 15, "Livewire Gaming": 5,
-              "Online Video": 20, "Affiliate": 10, "Influencer": 10, "Email": 15,
-              "OOH/DOOH": 15, "Audio": 10},
-    "Travel": {"Retail Media": 15, "Paid Search": 25, "Paid Social": 25, "Linear TV": 10,
-               "Programmatic Display": 20, "Connected TV": 15, "Livewire Gaming": 5,
-               "Online Video": 30, "Affiliate": 15, "Influencer": 20, "Email": 15,
-               "OOH/DOOH": 10, "Audio": 10},
-    "CPG": {"Retail Media": 30, "Paid Search": 15, "Paid Social": 10, "Linear TV": 35,
-            "Programmatic Display": 25, "Connected TV": 20, "Livewire Gaming": 5,
-            "Online Video": 15, "Affiliate": 10, "Influencer": 10, "Email": 10,
-            "OOH/DOOH": 25, "Audio": 10},
-    "Finance": {"Retail Media": 10, "Paid Search": 35, "Paid Social": 20, "Linear TV": 10,
-                "Programmatic Display": 20, "Connected TV": 10, "Livewire Gaming": 0,
-                "Online Video": 20, "Affiliate": 10, "Influencer": 15, "Email": 20,
-                "OOH/DOOH": 5, "Audio": 15},
-    "Technology": {"Retail Media": 15, "Paid Search": 25, "Paid Social": 30, "Linear TV": 5,
-                   "Programmatic Display": 25, "Connected TV": 15, "Livewire Gaming": 5,
-                   "Online Video": 25, "Affiliate": 15, "Influencer": 20, "Email": 15,
-                   "OOH/DOOH": 5, "Audio": 10},
-    "Retail": {"Retail Media": 35, "Paid Search": 20, "Paid Social": 15, "Linear TV": 30,
-               "Programmatic Display": 25, "Connected TV": 20, "Livewire Gaming": 5,
-               "Online Video": 20, "Affiliate": 15, "Influencer": 15, "Email": 10,
-               "OOH/DOOH": 30, "Audio": 10},
-    "Healthcare": {"Retail Media": 10, "Paid Search": 20, "Paid Social": 20, "Linear TV": 10,
-                   "Programmatic Display": 20, "Connected TV": 15, "Livewire Gaming": 0,
-                   "Online Video": 20, "Affiliate": 10, "Influencer": 10, "Email": 20,
-                   "OOH/DOOH": 10, "Audio": 10},
-    "Education": {"Retail Media": 10, "Paid Search": 15, "Paid Social": 15, "Linear TV": 5,
-                  "Programmatic Display": 15, "Connected TV": 10, "Livewire Gaming": 0,
-                  "Online Video": 20, "Affiliate": 10, "Influencer": 5, "Email": 15,
-                  "OOH/DOOH": 5, "Audio": 5},
-    "Hospitality": {"Retail Media": 20, "Paid Search": 15, "Paid Social": 20, "Linear TV": 15,
-                    "Programmatic Display": 20, "Connected TV": 20, "Livewire Gaming": 5,
-                    "Online Video": 25, "Affiliate": 15, "Influencer": 20, "Email": 15,
-                    "OOH/DOOH": 20, "Audio": 10},
-    "Automotive": {"Retail Media": 25, "Paid Search": 20, "Paid Social": 15, "Linear TV": 25,
-                   "Programmatic Display": 20, "Connected TV": 20, "Livewire Gaming": 5,
-                   "Online Video": 20, "Affiliate": 15, "Influencer": 10, "Email": 10,
-                   "OOH/DOOH": 25, "Audio": 10}
-}
-
-objective_adjustments = {
-    "Awareness": {"Paid Social": 1.2, "Online Video": 1.1, "Retail Media": 1.1},
-    "Growth": {"Paid Search": 1.2, "Programmatic Display": 1.1, "Online Video": 1.1},
-    "Profitability": {"Email": 1.2, "Affiliate": 1.1, "Retail Media": 0.9},
-    "Buy Rate": {"Paid Social": 1.1, "Online Video": 1.1, "Retail Media": 1.0},
-    "Household Penetration": {"OOH/DOOH": 1.2, "Retail Media": 1.1}
-}
-
-def compute_normalized_allocation(vertical, top_priority):
-    raw = vertical_channel_mix.get(vertical, {})
-    if top_priority != "-" and top_priority in objective_adjustments:
-        adjustments = objective_adjustments[top_priority]
-        adjusted = {ch: raw[ch] * adjustments.get(ch, 1) for ch in raw}
-    else:
-        adjusted = raw.copy()
-    total = sum(adjusted.values())
-    if total > 0:
-        normalized = {ch: (val / total) * 100 for ch, val in adjusted.items()}
-    else:
-        normalized = adjusted
-    return normalized
+# AI RESPONSE CACHE (memory LRU + on-disk SQLite, shared across sessions)
+# -------------------------------
+llm_cache = get_llm_cache()
 
 # -------------------------------
-# FUNCTION TO GENERATE FLIGHTING PATTERNS VIA AI
+# LLM ORCHESTRATION (shared thread pool: concurrent, timed, retried, cancellable calls)
 # -------------------------------
-def generate_flighting_patterns(channels, n_months, vertical, top_priority):
-    prompt = (
-        f"Generate a JSON object where the keys are the following channel names: {channels}. "
-        f"For each channel, output a list of {n_months} integers representing the percentage distribution of that channel's "
-        f"investment over {n_months} months for a campaign in the {vertical} vertical with a top priority of {top_priority}. "
-        f"Each list must sum to 100 and reflect realistic seasonal fluctuations for this industry. Return only valid JSON."
-    )
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7,
-        )
-        result = response.choices[0].message.content.strip()
-        patterns = json.loads(result)
-        return patterns
-    except Exception as e:
-        return None
+@st.cache_resource
+def get_orchestrator():
+    return LLMOrchestrator(max_workers=8)
+
+orchestrator = get_orchestrator()
+
+# -------------------------------
+# BACKGROUND COMPUTE (scenario simulations run here so reruns never wait on them)
+# -------------------------------
+@st.cache_resource
+def get_compute_pool():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="cortex-compute")
+
+compute_pool = get_compute_pool()
+
+# -------------------------------
+# PLAN STORE (SQLite/WAL: saved plan snapshots, history, reusable AI summaries)
+# -------------------------------
+plan_store = get_plan_store()
+
+def save_plan_snapshot(plan_inputs, final_plan, recommended_allocation, flighting_plan, granularity,
+                       catalog_version):
+    # Runs on the compute pool: building and rendering the PDF never delays a rerun.
+    report = build_report(plan_inputs, final_plan, recommended_allocation, flighting_plan, granularity)
+    plan_id, _ = plan_store.save_plan(plan_inputs, report, render_report_cached(report), catalog_version)
+    return plan_id
+
+# -------------------------------
+# OPT-IN PROFILING (CORTEX_PROFILE=1 or ?profile=1): stage timings, LLM latency/tokens, cache hits
+# -------------------------------
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+run_metrics = RunMetrics(enabled=PROFILE_ENABLED or st.query_params.get("profile") == "1",
+                         session_id=st.session_state.session_id)
+
+# -------------------------------
+# PER-SESSION ARTIFACTS (reused until their explicit dependencies change; size-capped, LRU-evicted)
+# -------------------------------
+if "session_memory" not in st.session_state:
+    st.session_state.session_memory = SessionMemory(st.session_state.session_id)
+session_memory = st.session_state.session_memory
+
+def session_artifact(name, deps, build, category="other"):
+    key = make_cache_key(**deps)
+    entry = session_memory.get(name, key)
+    if entry is None:
+        entry = session_memory.put(name, key, build(), category)
+    return entry.value
 
 # -------------------------------
 # SIDEBAR: CLIENT INPUTS
@@ -187,12 +134,16 @@ investment_high = st.sidebar.number_input("Investment Range - High-end ($)", min
 campaign_start = st.sidebar.date_input("Campaign Start Date", datetime.date.today())
 campaign_end = st.sidebar.date_input("Campaign End Date", datetime.date.today() + datetime.timedelta(days=30))
 
-vertical = st.sidebar.selectbox("Client Vertical", ["-","Other", "Travel", "CPG", "Finance", "Technology", "Retail", "Healthcare", "Education", "Hospitality", "Automotive"], index=0)
-top_priority = st.sidebar.selectbox("Top Priority Objective", ["-"] + list(objectives.keys()), index=0)
+# Verticals and objectives come from the taxonomy catalog (reloaded when its files change).
+catalog = get_catalog()
+vertical = st.sidebar.selectbox("Client Vertical", ["-"] + list(catalog.verticals), index=0)
+top_priority = st.sidebar.selectbox("Top Priority Objective", ["-"] + list(catalog.objectives), index=0)
 brand_lifecycle = st.sidebar.selectbox("Brand Lifecycle Stage", ["-", "New", "Growing", "Mature", "Declining"], index=0)
 marketing_priorities = st.sidebar.multiselect("Marketing Priorities", ["Increase conversions", "Boost retention", "Improve brand awareness", "Increase sales volume"], default=[])
 creative_formats = st.sidebar.multiselect("Creative Formats Available", ["OLV", "Static Images", "TV", "Interactive", "Audio"], default=[])
 
+run_metrics.checkpoint("inputs")
+
 # -------------------------------
 # NORMALIZE DEFAULT ALLOCATION
 # -------------------------------
@@ -205,11 +156,14 @@ original_investment_by_channel = {ch: mid_investment * (normalized_allocation[ch
 # -------------------------------
 # MANUAL ALLOCATION ADJUSTMENTS (User Inputs)
 # -------------------------------
+# Edits are batched in a form: changing the 13 inputs causes one rerun on submit, not one per input.
 if top_priority != "-" and normalized_allocation:
-    st.sidebar.subheader("Manual Allocation Adjustments")
-    updated_allocation = {}
-    for ch, default_val in normalized_allocation.items():
-        updated_allocation[ch] = st.sidebar.number_input(f"Allocation for {ch} (%)", min_value=0, max_value=100, value=int(round(default_val)), step=1, format="%d")
+    with st.sidebar.form("manual_allocation"):
+        st.subheader("Manual Allocation Adjustments")
+        updated_allocation = {}
+        for ch, default_val in normalized_allocation.items():
+            updated_allocation[ch] = st.number_input(f"Allocation for {ch} (%)", min_value=0, max_value=100, value=int(round(default_val)), step=1, format="%d")
+        st.form_submit_button("Apply Allocations")
 else:
     updated_allocation = {}
 
@@ -222,6 +176,60 @@ if updated_allocation:
 else:
     updated_investment_by_channel = original_investment_by_channel.copy()
 
+run_metrics.checkpoint("allocation")
+
+# -------------------------------
+# LAUNCH AI REQUESTS (flighting and, on Run Plan, the Final Plan start together)
+# -------------------------------
+# Number of calendar months the campaign touches (the AI refines flighting per calendar month)
+n_months = count_periods(campaign_start, campaign_end, "Calendar Month")
+channels_flighting = list(updated_allocation.keys())
+
+base_plan_summary = build_base_plan_summary(top_priority, brand_lifecycle, vertical)
+
+plan_inputs = dict(
+    brand_name=brand_name, business_problem=business_problem, additional_business_info=additional_business_info,
+    vertical=vertical, creative_formats=creative_formats, investment_low=investment_low,
+    investment_high=investment_high, campaign_start=campaign_start, campaign_end=campaign_end,
+    updated_allocations=updated_allocation, base_summary=base_plan_summary,
+    marketing_priorities=marketing_priorities, top_priority=top_priority, brand_lifecycle=brand_lifecycle,
+)
+plan_key = make_cache_key(**plan_inputs)
+
+# Inputs changed while a Final Plan was still streaming: stop paying for the stale request.
+stale_job = st.session_state.get("plan_job")
+if stale_job is not None and stale_job.key != plan_key:
+    stale_job.cancel()
+    st.session_state.plan_job = None
+
+if st.sidebar.button("Run Plan"):
+    plan_messages = build_full_plan_messages(**plan_inputs)
+    # Identical prompts to the same model and backend reuse the stored summary instead of a new AI call.
+    plan_request_key = make_cache_key(kind="final_plan", model=PLAN_MODEL, backend=get_llm_client().backend.name,
+                                      messages=plan_messages)
+    stored_plan = plan_store.find_llm_output(plan_request_key)
+    if stored_plan is not None:
+        st.session_state.final_plan = stored_plan
+        st.session_state.plan_reused = True
+        st.session_state.plan_saved = False
+    else:
+        st.session_state.plan_job = orchestrator.stream(plan_key, stream_full_plan, plan_messages, retries=2)
+        st.session_state.plan_request_key = plan_request_key
+        st.session_state.plan_reused = False
+
+with st.sidebar.expander("AI Service Stats"):
+    st.json({"cache": llm_cache.stats(), "client": get_llm_client().stats(), "plan_store": plan_store.stats()})
+
+catalog_info = catalog_status()
+if catalog_info["reload_error"]:
+    st.sidebar.warning(f"Catalog files changed but failed validation; still using catalog {catalog_info['version']}.")
+with st.sidebar.expander("Planning Catalog"):
+    st.json(catalog_info)
+
+# Latest flighting and plan text, read by the deferred PDF export when the button is clicked.
+export_state = st.session_state.setdefault("export_state", {})
+run_metrics.checkpoint("launch")
+
 # -------------------------------
 # SUMMARY OF CLIENT INPUTS
 # -------------------------------
@@ -246,258 +254,381 @@ st.write(f"**Creative Formats Available:** {', '.join(creative_formats) if creat
 # -------------------------------
 if top_priority != "-":
     st.subheader("Objective Details")
-    details_data = {
-        "Attribute": ["Strategic Imperatives", "KPIs", "Core Audiences", "Messaging Approach"],
-        "Description": [
-            objectives[top_priority]["Strategic Imperatives"],
-            objectives[top_priority]["KPIs"],
-            objectives[top_priority]["Core Audiences"],
-            objectives[top_priority]["Messaging Approach"]
-        ]
-    }
-    details_df = pd.DataFrame(details_data)
-    st.table(details_df)
+    details = catalog.objective_details[top_priority]
+    # Tables are passed as plain columns: pandas is loaded by the first table drawn, not at startup.
+    st.table({
+        "Attribute": list(OBJECTIVE_DETAIL_FIELDS),
+        "Description": [details[field] for field in OBJECTIVE_DETAIL_FIELDS],
+    })
 else:
     st.info("Please select a Top Priority Objective to view its details.")
+run_metrics.checkpoint("overview")
 
 # -------------------------------
 # PIE CHARTS FOR CHANNEL ALLOCATION
 # -------------------------------
-st.subheader("Channel Allocation Comparison")
-base_colors = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A', '#19D3F3',
-               '#FF6692', '#B6E880', '#FF97FF', '#FECB52', '#1f77b4', '#ff7f0e']
-
-channels_original = list(normalized_allocation.keys())
-colors_original = [base_colors[i % len(base_colors)] for i in range(len(channels_original))]
-pie_original = go.Figure(data=[go.Pie(
-    labels=channels_original,
-    values=list(normalized_allocation.values()),
-    marker=dict(colors=colors_original)
-)])
-pie_original.update_layout(title="Original Allocation (Normalized)")
-
-if updated_allocation:
-    channels_updated = list(updated_allocation.keys())
-    colors_updated = [base_colors[i % len(base_colors)] for i in range(len(channels_updated))]
-    pie_updated = go.Figure(data=[go.Pie(
-        labels=channels_updated,
-        values=list(updated_allocation.values()),
-        marker=dict(colors=colors_updated)
-    )])
-    pie_updated.update_layout(title="Updated Allocation (Manual)")
-else:
-    channels_updated = channels_original
-    colors_updated = colors_original
-    pie_updated = go.Figure(data=[go.Pie(
-        labels=channels_updated,
-        values=list(normalized_allocation.values()),
-        marker=dict(colors=colors_updated)
-    )])
-    pie_updated.update_layout(title="Updated Allocation (Same as Original)")
+@st.fragment
+def allocation_charts_fragment(normalized_allocation, updated_allocation):
+    st.subheader("Channel Allocation Comparison")
+    # Two pie figures per session, created once and patched when the allocations change.
+    pie_original, pie_updated = session_artifact("allocation_pies", {}, lambda: (PieChart(), PieChart()),
+                                                 category="figure")
+    pie_original.update(make_cache_key(allocation=normalized_allocation), normalized_allocation,
+                        "Original Allocation (Normalized)")
+    if updated_allocation:
+        pie_updated.update(make_cache_key(allocation=updated_allocation, manual=True), updated_allocation,
+                           "Updated Allocation (Manual)")
+    else:
+        pie_updated.update(make_cache_key(allocation=normalized_allocation, manual=False), normalized_allocation,
+                           "Updated Allocation (Same as Original)")
+    st.plotly_chart(pie_original.figure, width="stretch")
+    st.plotly_chart(pie_updated.figure, width="stretch")
 
-st.plotly_chart(pie_original, use_container_width=True)
-st.plotly_chart(pie_updated, use_container_width=True)
+allocation_charts_fragment(normalized_allocation, updated_allocation)
+run_metrics.checkpoint("allocation_charts")
 
 # -------------------------------
-# FLIGHTING LINE GRAPH: DYNAMIC INVESTMENT BY MONTH PER CHANNEL
+# BUDGET OPTIMIZER: EFFICIENT FRONTIER ACROSS THE INVESTMENT RANGE
 # -------------------------------
-st.subheader("Flighting: Investment by Month")
+# The budget slider lives in the fragment: re-solving for a new budget reruns only this section.
+@st.fragment
+def optimizer_fragment(vertical, top_priority, investment_low, investment_high, current_budget, current_investment):
+    st.subheader("Budget Optimizer: Diminishing Returns")
+    low, high = sorted((investment_low, investment_high))
+    if high > low:
+        budget = st.slider("Budget to Optimize ($)", min_value=int(low), max_value=int(high),
+                           value=int(current_budget), step=1000, format="$%d")
+    else:
+        budget = low
+    optimizer = get_budget_optimizer()
+    frontier = session_artifact(
+        "frontier", dict(vertical=vertical, top_priority=top_priority, low=low, high=high, catalog=optimizer.version),
+        lambda: optimizer.frontier(vertical, top_priority, low, high),
+    )
+    optimum = optimizer.optimize(vertical, top_priority, [budget])
+    current_response = optimizer.response(vertical, top_priority, current_investment)
+    frontier_chart = session_artifact("frontier_chart", {}, FrontierChart, category="figure")
+    frontier_chart.update(make_cache_key(vertical=vertical, top_priority=top_priority, low=low, high=high,
+                                         catalog=optimizer.version), frontier)
+    frontier_chart.set_points(budget, optimum.response[0], current_budget, current_response)
+    st.plotly_chart(frontier_chart.figure, width="stretch")
+    st.caption(f"Marginal return at ${budget:,.0f}: {optimum.marginal_roi[0]:.3f} index points per additional $1,000.")
+    funded = [c for c, ch in enumerate(optimum.channels) if ch in current_investment or optimum.allocations[0, c] > 0]
+    st.dataframe(
+        {
+            "Channel": [optimum.channels[c] for c in funded],
+            "Optimal Investment ($)": optimum.allocations[0, funded],
+            "Optimal Share (%)": optimum.allocations[0, funded] / budget * 100 if budget else 0.0,
+            "Current Investment ($)": [current_investment.get(optimum.channels[c], 0.0) for c in funded],
+        },
+        column_config={
+            "Optimal Investment ($)": st.column_config.NumberColumn(format="$%,.0f"),
+            "Optimal Share (%)": st.column_config.NumberColumn(format="%.1f%%"),
+            "Current Investment ($)": st.column_config.NumberColumn(format="$%,.0f"),
+        },
+        hide_index=True, width="stretch",
+    )
 
-# Calculate campaign duration in months (approximate)
-n_months = ((campaign_end - campaign_start).days // 30) + 1
-month_labels = [f"Month {i+1}" for i in range(n_months)]
+if top_priority != "-" and normalized_allocation:
+    optimizer_fragment(vertical, top_priority, investment_low, investment_high, mid_investment,
+                       updated_investment_by_channel)
+run_metrics.checkpoint("optimizer")
 
-# Generate flighting patterns via AI
-channels_flighting = list(updated_allocation.keys())
-flighting_patterns = generate_flighting_patterns(channels_flighting, n_months, vertical, top_priority)
-flighting_data = {}
-if flighting_patterns is None:
-    st.warning("Could not generate dynamic flighting; using uniform distribution.")
-    for ch in channels_flighting:
-        monthly = updated_investment_by_channel.get(ch, 0) / n_months
-        flighting_data[ch] = [monthly] * n_months
-else:
-    for ch in channels_flighting:
-        pattern = flighting_patterns.get(ch)
-        if pattern and sum(pattern) == 100:
-            flighting_data[ch] = [updated_investment_by_channel.get(ch, 0) * (p / 100) for p in pattern]
+# -------------------------------
+# FLIGHTING LINE GRAPH: DYNAMIC INVESTMENT BY PERIOD PER CHANNEL
+# -------------------------------
+def simulation_table(simulation):
+    rows = {"Total Investment ($)": simulation.budget}
+    if simulation.response is not None:
+        rows["Response Index"] = simulation.response
+    if simulation.cost_per_point is not None:
+        rows["Cost per Response Point ($)"] = simulation.cost_per_point
+    # Percentile columns, one row per measure.
+    return {f"P{q}": {name: values[i] for name, values in rows.items()}
+            for i, q in enumerate(simulation.percentiles)}
+
+# Polls the background simulation; once it finishes, one rerun redraws the chart with bands and stops polling.
+@st.fragment(run_every=0.5)
+def simulation_progress_fragment(simulation_future):
+    if simulation_future.done():
+        st.rerun()
+    st.caption(f"Simulating {SIMULATION_SCENARIOS:,} scenarios for outcome ranges...")
+
+# Granularity and AI refinement live inside the fragment, so changing them reruns only the flighting section.
+@st.fragment
+def flighting_fragment(channels, budgets, campaign_start, campaign_end, vertical, top_priority, n_months,
+                       investment_low, investment_high):
+    st.subheader("Flighting: Investment by Period")
+    granularity_col, refine_col = st.columns(2)
+    granularity = granularity_col.selectbox("Flighting Granularity", list(GRANULARITIES), index=0)
+    refine_flighting = refine_col.checkbox("Refine flighting with AI", value=False)
+
+    # The seasonal engine is the fast path; the AI call only refines it when requested.
+    flighting_overrides = {}
+    if refine_flighting and channels:
+        flighting_future = orchestrator.submit(
+            generate_flighting_patterns, channels, n_months, vertical, top_priority, cache=llm_cache, retries=1
+        )
+        with run_metrics.stage("flighting_ai_wait"):
+            try:
+                flighting_patterns = flighting_future.result(timeout=FLIGHTING_TIMEOUT * 2)
+                flighting_error = None
+            except Exception as e:
+                flighting_patterns, flighting_error = None, e
+        if flighting_patterns is None:
+            reason = str(flighting_error) or type(flighting_error).__name__
+            st.warning(f"Could not refine flighting with AI ({reason}); using the seasonal baseline.")
+        elif not flighting_patterns:
+            st.warning("The AI response had no usable flighting patterns; using the seasonal baseline.")
         else:
-            monthly = updated_investment_by_channel.get(ch, 0) / n_months
-            flighting_data[ch] = [monthly] * n_months
-
-flighting_fig = go.Figure()
-for ch, investments in flighting_data.items():
-    flighting_fig.add_trace(go.Scatter(
-        x=month_labels,
-        y=investments,
-        mode='lines+markers',
-        name=ch
-    ))
-flighting_fig.update_layout(
-    title="Monthly Investment by Channel (Dynamic Flighting)",
-    xaxis_title="Month",
-    yaxis_title="Investment ($)",
-    yaxis=dict(tickprefix="$")
+            # Already validated and repaired; channels the model skipped keep the seasonal baseline.
+            flighting_overrides = {ch: flighting_patterns[ch] for ch in channels if ch in flighting_patterns}
+            if len(flighting_overrides) < len(channels):
+                st.caption(f"AI refined {len(flighting_overrides)} of {len(channels)} channels; "
+                           "the others keep the seasonal baseline.")
+
+    # Daily seasonal flighting over the real campaign calendar, rolled up to the chosen granularity
+    plan_deps = dict(channels=channels, budgets=budgets, start=campaign_start, end=campaign_end,
+                     vertical=vertical, top_priority=top_priority, overrides=flighting_overrides,
+                     catalog=get_catalog().version)
+    flighting_plan = session_artifact(
+        "flighting_plan", plan_deps,
+        lambda: FlightingPlan.build(channels, budgets, campaign_start, campaign_end, vertical, top_priority,
+                                    flighting_overrides),
+        category="flighting",
+    )
+    # Monte Carlo outcome ranges are computed off the script thread and added to the chart when ready.
+    simulation = simulation_future = None
+    if channels:
+        simulation_future = session_artifact(
+            "simulation", dict(plan_deps, granularity=granularity, low=investment_low, high=investment_high),
+            lambda: compute_pool.submit(simulate_plan_cached, flighting_plan, granularity, investment_low,
+                                        investment_high, vertical, top_priority),
+            category="simulation",
+        )
+        # A simulation for inputs that have since changed is no longer wanted; drop it if not yet started.
+        previous_future = st.session_state.get("simulation_future")
+        if previous_future is not None and previous_future is not simulation_future:
+            previous_future.cancel()
+        st.session_state.simulation_future = simulation_future
+        if simulation_future.done() and not simulation_future.cancelled() and simulation_future.exception() is None:
+            simulation = simulation_future.result()
+    # One figure per channel set and trace type, patched in place for new flighting or simulation bands.
+    _, flighting_matrix = flighting_plan.rollup(granularity)
+    webgl = FlightingChart.use_webgl(len(flighting_plan.channels), flighting_matrix.shape[1])
+    flighting_chart = session_artifact(
+        "flighting_chart", dict(channels=flighting_plan.channels, webgl=webgl),
+        lambda: FlightingChart(flighting_plan.channels, webgl), category="figure",
+    )
+    if flighting_chart.update(make_cache_key(**plan_deps, granularity=granularity, simulated=simulation is not None,
+                                             low=investment_low, high=investment_high),
+                              flighting_plan.labels(granularity), flighting_matrix, granularity, simulation):
+        session_memory.refresh("flighting_chart")
+    st.plotly_chart(flighting_chart.figure, width="stretch")
+    if flighting_chart.displayed_points < flighting_chart.total_points:
+        st.caption(f"Chart shows {flighting_chart.displayed_points:,} of {flighting_chart.total_points:,} periods "
+                   "per channel (shape-preserving downsampling); the table and PDF report use every period.")
+    if simulation is not None:
+        st.caption(f"Shaded bands: range of total spend per period across {simulation.scenarios:,} simulated "
+                   "scenarios (budget within the investment range, channel performance and flighting variation).")
+        st.dataframe(simulation_table(simulation), column_config={
+            f"P{q}": st.column_config.NumberColumn(format="%,.1f") for q in simulation.percentiles
+        }, width="stretch")
+    elif simulation_future is not None and not simulation_future.done():
+        simulation_progress_fragment(simulation_future)
+
+    # Create a flighting table (channels x periods, numeric; formatting happens client-side).
+    flighting_df = flighting_plan.to_frame(granularity)
+    st.subheader("Flighting Investment Table")
+    st.dataframe(
+        flighting_df,
+        column_config={col: st.column_config.NumberColumn(col, format="$%,.0f") for col in flighting_df.columns},
+        width="stretch",
+    )
+    export_state.update(flighting_plan=flighting_plan, granularity=granularity)
+
+flighting_fragment(
+    channels_flighting, [updated_investment_by_channel.get(ch, 0) for ch in channels_flighting],
+    campaign_start, campaign_end, vertical, top_priority, n_months, investment_low, investment_high,
 )
-st.plotly_chart(flighting_fig, use_container_width=True)
-
-# Create a flighting table.
-flighting_table = []
-for ch in channels_flighting:
-    monthly_investments = flighting_data[ch]
-    total_channel = sum(monthly_investments)
-    flighting_table.append({
-        "Channel": ch,
-        "Monthly Investment ($)": f"{[f'${m:,.0f}' for m in monthly_investments]}",
-        "Total Investment ($)": f"${total_channel:,.0f}"
-    })
-flighting_df = pd.DataFrame(flighting_table)
-st.subheader("Flighting Investment Table")
-st.table(flighting_df)
+run_metrics.checkpoint("flighting")
 
 # -------------------------------
 # FINAL AI GENERATED PLAN SUMMARY (Unified)
 # -------------------------------
-st.subheader("Final Plan Summary")
-
-def generate_full_plan(brand_name, business_problem, additional_business_info, vertical, creative_formats,
-                       investment_low, investment_high, campaign_start, campaign_end, updated_allocations, base_summary):
-    reference_content = ""
-    if os.path.exists("reference.txt"):
-        with open("reference.txt", "r", encoding="utf-8") as f:
-            reference_content = f.read()
-    
-    full_context = (
-        f"You are a professional paid media and marketing consultant with deep expertise in the {vertical} vertical and a strong alignment with Junction 37's approach. "
-        f"Generate a final plan summary that includes two parts: first, a 'TLDR:' section with a one-sentence summary; then an expanded analysis (2-3 paragraphs) that includes:\n"
-        f"1. Creative Themes: List 3-5 creative themes that align with the target audiences.\n"
-        f"2. Key Audiences: List 3 key prospecting audiences and 3 key conversion audiences, with reasoning supported by credible marketing articles.\n"
-        f"3. Suggested Flighting: Provide recommendations for how the investment should be distributed over the campaign duration.\n"
-        f"Finally, include 5 specific, real, credible marketing article links from sources such as Ad Age, Marketing Land, Adweek, HubSpot Marketing, and Marketing Dive.\n\n"
-        f"Brand Name: {brand_name}\n"
-        f"Business Problem: {business_problem}\n"
-        f"Additional Business Info: {additional_business_info}\n"
-        f"Client Vertical: {vertical}\n"
-        f"Investment Range: ${investment_low:,} - ${investment_high:,}\n"
-        f"Campaign Start Date: {campaign_start}\n"
-        f"Campaign End Date: {campaign_end}\n"
-        f"Creative Formats Available: {', '.join(creative_formats) if creative_formats else 'None'}\n"
-        f"Marketing Priorities: {', '.join(marketing_priorities) if marketing_priorities else 'None'}\n"
-        f"Updated Channel Allocations: " + ", ".join([f"{ch}: {updated_allocations[ch]}" for ch in updated_allocations]) + "\n"
-        f"Reference Documents: {reference_content}\n\n"
-        f"Other Client Inputs:\n"
-        f"Top Priority Objective: {top_priority}\n"
-        f"Brand Lifecycle Stage: {brand_lifecycle}\n\n"
-        f"Base strategy summary: {base_summary}\n\n"
-        f"Generate a final plan summary with a TLDR section (one sentence) and an expanded analysis (2-3 paragraphs) that includes all the sections described above."
-    )
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a professional paid media and marketing consultant with deep expertise in the client's vertical and a deep understanding of Junction 37's approach."},
-                {"role": "user", "content": full_context}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        generated_text = response.choices[0].message.content.strip()
-        return generated_text
-    except Exception as e:
-        return "Error generating AI insight: " + str(e)
+if "final_plan" not in st.session_state:
+    st.session_state.final_plan = base_plan_summary
 
-if top_priority != "-":
-    base_plan_summary = (
-        f"Your top priority is {top_priority} for a brand in the {brand_lifecycle} stage operating in the {vertical} vertical. "
-        f"Recommended actions include {objectives[top_priority]['Strategic Imperatives'].lower()} and leveraging a channel mix updated based on client inputs."
+@st.fragment
+def summary_fragment(plan_inputs, normalized_allocation):
+    st.subheader("Final Plan Summary")
+    plan_job = st.session_state.get("plan_job")
+    if plan_job is not None:
+        try:
+            st.write_stream(plan_job.iter_chunks(timeout=PLAN_TIMEOUT))
+        except TimeoutError as e:
+            plan_job.cancel()
+            plan_job.error = e
+        streamed = plan_job.text()
+        if plan_job.error is not None and not streamed:
+            streamed = "Error generating AI insight: " + str(plan_job.error)
+            st.markdown(streamed)
+        elif plan_job.error is not None:
+            # Marked in the text itself, so the page, the download and the PDF never pass it off as complete.
+            reason = str(plan_job.error) or type(plan_job.error).__name__
+            streamed += f"\n\n[Incomplete summary: generation stopped early ({reason}).]"
+            st.warning(f"The AI summary stopped early ({reason}) and is incomplete; run the plan again for "
+                       "a full summary.")
+        elif streamed:
+            plan_store.record_llm_output(st.session_state.plan_request_key, streamed)
+            st.session_state.plan_saved = False
+        st.session_state.final_plan = streamed
+        st.session_state.plan_job = None
+    else:
+        st.markdown(st.session_state.final_plan)
+        if st.session_state.get("plan_reused"):
+            st.caption("Reused the saved summary for these exact inputs; no new AI request was made.")
+    export_state["final_plan"] = st.session_state.final_plan
+    # Snapshot each completed plan once, with the flighting the page is showing.
+    if st.session_state.get("plan_saved") is False:
+        st.session_state.plan_saved = True
+        compute_pool.submit(save_plan_snapshot, plan_inputs, st.session_state.final_plan, normalized_allocation,
+                            export_state["flighting_plan"], export_state["granularity"], get_catalog().version)
+
+summary_fragment(plan_inputs, normalized_allocation)
+run_metrics.checkpoint("summary")
+
+# -------------------------------
+# PDF REPORT
+# -------------------------------
+@st.fragment
+def export_fragment(plan_inputs, normalized_allocation):
+    # The report is assembled and rendered only when the button is clicked, on Streamlit's
+    # download thread, from whatever flighting and summary the other fragments last produced.
+    def render():
+        report = build_report(plan_inputs, export_state["final_plan"], normalized_allocation,
+                              export_state["flighting_plan"], export_state["granularity"])
+        key = report_fingerprint(report)
+        entry = session_memory.get("report_pdf", key)
+        if entry is None:
+            entry = session_memory.put("report_pdf", key, render_report_cached(report), "pdf")
+        return entry.value
+
+    st.download_button(
+        label="Download PDF Report",
+        data=render,
+        file_name="cortex_plan_report.pdf",
+        mime="application/pdf",
+        on_click="ignore",
     )
-else:
-    base_plan_summary = "No top priority objective selected."
 
-if "final_plan" not in st.session_state:
-    st.session_state.final_plan = base_plan_summary
+export_fragment(plan_inputs, normalized_allocation)
+run_metrics.checkpoint("export")
 
-if st.sidebar.button("Run Plan"):
-    st.session_state.final_plan = generate_full_plan(
-        brand_name, business_problem, additional_business_info, vertical, creative_formats,
-        investment_low, investment_high, campaign_start, campaign_end, updated_allocation, base_plan_summary
+# -------------------------------
+# PLAN HISTORY (saved snapshots: filter, compare side by side, re-download)
+# -------------------------------
+def saved_at(created_at):
+    # One timezone for every saved-plan timestamp, whatever the server's local time is.
+    return datetime.datetime.fromtimestamp(created_at, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+@st.fragment
+def history_fragment():
+    st.subheader("Plan History")
+    filters = {}
+    for column, (name, label) in zip(st.columns(3), (("brand", "Brand"), ("vertical", "Vertical"),
+                                                      ("objective", "Objective"))):
+        choice = column.selectbox(f"Filter by {label}", ["All"] + plan_store.distinct(name), key=f"history_{name}")
+        filters[name] = None if choice == "All" else choice
+    plans = plan_store.history(**filters)
+    if not plans:
+        st.info("No saved plans yet. Each completed **Run Plan** is saved here.")
+        return
+    history = {
+        "Saved": [saved_at(p["created_at"]) for p in plans],
+        "Brand": [p["brand"] for p in plans],
+        "Vertical": [p["vertical"] for p in plans],
+        "Objective": [p["objective"] for p in plans],
+        "Campaign": [f"{p['campaign_start']} to {p['campaign_end']}" for p in plans],
+        "Investment": [f"${p['investment_low']:,} - ${p['investment_high']:,}" for p in plans],
+    }
+    selection = st.dataframe(history, hide_index=True, width="stretch", on_select="rerun",
+                             selection_mode="multi-row", key="plan_history")
+    selected = [plan_store.load_plan(plans[i]["plan_id"]) for i in selection.selection.rows]
+    if not selected:
+        st.caption("Select plans to compare them side by side.")
+        return
+
+    fields = {"Brand": "brand_name", "Vertical": "vertical", "Objective": "top_priority",
+              "Brand Lifecycle": "brand_lifecycle", "Campaign Start": "campaign_start",
+              "Campaign End": "campaign_end", "Investment Low ($)": "investment_low",
+              "Investment High ($)": "investment_high"}
+    channels = sorted({ch for plan in selected for ch in plan["allocations"]["updated"]})
+    compare = {}
+    for n, plan in enumerate(selected, start=1):
+        column = {label: str(plan["inputs"].get(field, "")) for label, field in fields.items()}
+        column["Catalog Version"] = plan["catalog_version"] or "unrecorded"
+        column.update({f"{ch} (%)": str(plan["allocations"]["updated"].get(ch, 0)) for ch in channels})
+        compare[f"#{n} {plan['brand']} ({saved_at(plan['created_at'])})"] = column
+    st.dataframe(compare, width="stretch")
+
+    for n, plan in enumerate(selected, start=1):
+        with st.expander(f"#{n} Final Plan Summary"):
+            st.markdown(plan["summary"])
+            if plan["pdf_hash"]:
+                st.download_button(
+                    label="Download saved PDF",
+                    data=lambda plan_id=plan["plan_id"]: plan_store.load_pdf(plan_id),
+                    file_name=f"cortex_plan_{plan['plan_id'][:8]}.pdf",
+                    mime="application/pdf",
+                    on_click="ignore",
+                    key=f"history_pdf_{plan['plan_id']}",
+                )
+
+history_fragment()
+run_metrics.checkpoint("history")
+
+# -------------------------------
+# SESSION MEMORY (artifacts this session holds, against its caps)
+# -------------------------------
+with st.sidebar.expander("Session Memory"):
+    session_usage = session_memory.usage()
+    st.metric("Artifacts held", f"{session_usage['total_bytes'] / 2**20:.1f} MB",
+              help=f"Capped at {session_usage['limit_bytes'] / 2**20:.0f} MB per session; "
+                   f"{session_usage['evictions']} artifacts evicted so far.")
+    st.dataframe(
+        {
+            "Artifact": [a["name"] for a in session_usage["artifacts"]],
+            "Category": [a["category"] for a in session_usage["artifacts"]],
+            "Size (KB)": [a["bytes"] / 1024 for a in session_usage["artifacts"]],
+        },
+        column_config={"Size (KB)": st.column_config.NumberColumn(format="%,.1f")},
+        hide_index=True, width="stretch",
     )
 
-st.markdown(st.session_state.final_plan)
-
-# -------------------------------
-# GENERATE PDF REPORT USING FPDF (Enhanced Formatting)
-# -------------------------------
-def generate_pdf(report_text):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Cortex Plan Report", ln=True, align="C")
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 10, f"Report Date: {datetime.datetime.now().strftime('%Y-%m-%d')}", ln=True, align="C")
-    pdf.ln(10)
-    
-    header_labels = [
-        "Brand Name:", "Business Problem:", "Additional Business Info:", "Investment Range:",
-        "Campaign Start Date:", "Campaign End Date:", "Top Priority Objective:",
-        "Brand Lifecycle Stage:", "Client Vertical:", "Marketing Priorities:",
-        "Creative Formats Available:", "Strategic Details:", "Recommended Channel Mix",
-        "Updated Channel Allocations:", "Final Plan Summary:", "Case Study:"
-    ]
-    
-    for line in report_text.split('\n'):
-        if any(line.startswith(header) for header in header_labels):
-            pdf.set_font("Arial", "B", 12)
-        else:
-            pdf.set_font("Arial", "", 12)
-        safe_line = line.encode("latin1", "replace").decode("latin1")
-        pdf.multi_cell(0, 10, txt=safe_line)
-    pdf.ln(5)
-    pdf_output_str = pdf.output(dest="S")
-    pdf_bytes = pdf_output_str.encode("latin1", "replace")
-    return pdf_bytes
-
-report_text = f"""
-Cortex Plan Report
-
-Brand Name: {brand_name}
-Business Problem: {business_problem}
-Additional Business Info: {additional_business_info}
-Investment Range: ${investment_low:,} - ${investment_high:,}
-
-Campaign Start Date: {campaign_start}
-Campaign End Date: {campaign_end}
-
-Top Priority Objective: {top_priority}
-Brand Lifecycle Stage: {brand_lifecycle}
-Client Vertical: {vertical}
-Marketing Priorities: {', '.join(marketing_priorities) if marketing_priorities else 'None'}
-Creative Formats Available: {', '.join(creative_formats) if creative_formats else 'None'}
-
-Strategic Details:
-- Strategic Imperatives: {objectives[top_priority]['Strategic Imperatives'] if top_priority != "-" else "N/A"}
-- KPIs: {objectives[top_priority]['KPIs'] if top_priority != "-" else "N/A"}
-- Core Audiences: {objectives[top_priority]['Core Audiences'] if top_priority != "-" else "N/A"}
-- Messaging Approach: {objectives[top_priority]['Messaging Approach'] if top_priority != "-" else "N/A"}
-
-Recommended Channel Mix (for {vertical}):
-""" + "\n".join([f"- {channel}: {vertical_channel_mix[vertical][channel]}" for channel in vertical_channel_mix.get(vertical, {})]) + f"""
-
-Updated Channel Allocations:
-""" + "\n".join([f"- {channel}: {updated_allocation.get(channel, 0)}" for channel in updated_allocation]) + f"""
-
-Final Plan Summary:
-{st.session_state.final_plan}
-
-Case Study:
-Our client [Placeholder] achieved remarkable results by aligning their paid media strategy with {top_priority}.
-"""
-
-pdf_data = generate_pdf(report_text)
-
-st.download_button(
-    label="Download PDF Report",
-    data=pdf_data,
-    file_name="cortex_plan_report.pdf",
-    mime="application/pdf"
-)
+# -------------------------------
+# DEBUG PANEL (profiling only; also appended to CORTEX_METRICS_PATH when set)
+# -------------------------------
+if run_metrics.enabled:
+    process_memory = memory_report()
+    run_summary = run_metrics.dump(cache=llm_cache.stats(), memory=process_memory)
+    with st.sidebar.expander("Performance (debug)"):
+        st.metric("Script run", f"{run_summary['total_ms']:.0f} ms")
+        st.dataframe(
+            {"Stage": list(run_summary["stages_ms"]), "Time (ms)": list(run_summary["stages_ms"].values())},
+            hide_index=True, width="stretch",
+        )
+        st.json({"llm": run_summary["llm"], "llm_calls": run_summary["llm_calls"], "cache": run_summary["cache"]},
+                expanded=False)
+        st.caption(f"{process_memory['sessions']} sessions hold "
+                   f"{process_memory['tracked_bytes'] / 2**20:.1f} MB of artifacts"
+                   + (f"; process RSS {process_memory['process_rss_bytes'] / 2**20:.0f} MB."
+                      if process_memory["process_rss_bytes"] else "."))
+        st.dataframe(
+            {
+                "Session": [u["session_id"] for u in process_memory["per_session"]],
+                "Artifacts (KB)": [u["total_bytes"] / 1024 for u in process_memory["per_session"]],
+                "Evictions": [u["evictions"] for u in process_memory["per_session"]],
+            },
+            hide_index=True, width="stretch",
+        )
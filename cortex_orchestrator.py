@@ -0,0 +1,124 @@
+"""Thread-pool orchestration for concurrent, cancellable LLM calls."""
+import contextvars
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+def is_retryable(exc):
+    """Errors may opt out of retries with ``retryable = False`` (e.g. an open circuit breaker)."""
+    return getattr(exc, "retryable", True)
+
+
+def call_with_retries(fn, args=(), kwargs=None, retries=2, backoff=0.5, cancel_event=None):
+    """Call ``fn`` and retry failures with exponential backoff until cancelled."""
+    kwargs = kwargs or {}
+    cancel_event = cancel_event or threading.Event()
+    attempt = 0
+    while True:
+        if cancel_event.is_set():
+            raise CancelledError()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or cancel_event.is_set() or not is_retryable(e):
+                raise
+            cancel_event.wait(backoff * (2 ** attempt))
+            attempt += 1
+
+
+class StreamJob:
+    """Buffer of text chunks produced by a background streaming call.
+
+    Chunks are kept so a rerun that finds the job still running can replay
+    what was already received and then keep following the live stream.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.error = None
+        self.finished = False
+        self.cancel_event = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def text(self):
+        with self._cond:
+            return "".join(self.chunks)
+
+    def iter_chunks(self, timeout=None):
+        """Yield buffered and then live chunks; ``timeout`` bounds each wait."""
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.chunks) and not self.finished and not self.cancelled:
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError(f"No streamed output within {timeout} seconds")
+                pending = self.chunks[position:]
+                done = self.finished or self.cancelled
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if done and position >= len(self.chunks):
+                return
+
+    def _push(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def _finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.finished = True
+            self._cond.notify_all()
+
+
+class LLMOrchestrator:
+    """Runs LLM requests on a shared thread pool so they overlap each other and the script."""
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cortex-llm")
+
+    def submit(self, fn, *args, retries=2, backoff=0.5, cancel_event=None, **kwargs):
+        # In the caller's context, so the calls are charged to its session (see cortex_metrics).
+        return self._executor.submit(
+            contextvars.copy_context().run, call_with_retries, fn, args, kwargs, retries=retries, backoff=backoff,
+            cancel_event=cancel_event,
+        )
+
+    def stream(self, key, stream_fn, *args, retries=2, backoff=0.5, **kwargs):
+        """Start ``stream_fn(*args, cancel_event=..., **kwargs)`` in the background.
+
+        Failures are retried only until the first chunk has been delivered, so
+        a retry never duplicates text already shown to the user.
+        """
+        job = StreamJob(key)
+
+        def run():
+            attempt = 0
+            while True:
+                try:
+                    for chunk in stream_fn(*args, cancel_event=job.cancel_event, **kwargs):
+                        if job.cancelled:
+                            break
+                        job._push(chunk)
+                    job._finish()
+                    return
+                except Exception as e:
+                    if job.chunks or attempt >= retries or job.cancelled or not is_retryable(e):
+                        job._finish(e)
+                        return
+                    job.cancel_event.wait(backoff * (2 ** attempt))
+                    attempt += 1
+
+        self._executor.submit(contextvars.copy_context().run, run)
+        return job
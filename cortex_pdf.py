@@ -0,0 +1,256 @@
+"""PDF rendering for plan reports: vector pie and line charts, tables and text with fpdf.
+
+Kept apart from cortex_report so fpdf is imported only when a PDF is
+actually rendered (see ``cortex_report.render_report``).
+"""
+import math
+import re
+from functools import lru_cache
+
+import numpy as np
+from fpdf import FPDF
+from fpdf.fonts import fpdf_charwidths
+
+from cortex_data import base_colors
+
+FLIGHTING_TABLE_CHANNELS_PER_BLOCK = 10
+# Line charts never draw more vertices per series than this, however long the plan is.
+MAX_CHART_POINTS = 240
+
+# -------------------------------
+# CACHED FONT METRICS AND CHART DRAWING OPERATORS
+# -------------------------------
+def _latin1(text):
+    return str(text).encode("latin1", "replace").decode("latin1")
+
+
+@lru_cache(maxsize=4096)
+def _string_width(font_key, size, text):
+    widths = fpdf_charwidths[font_key]
+    return sum(widths.get(ch, 0) for ch in text) * size / 1000 / (72 / 25.4)
+
+
+def _fit(font_key, size, text, width):
+    text = _latin1(text)
+    if _string_width(font_key, size, text) <= width:
+        return text
+    while text and _string_width(font_key, size, text + "...") > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def _rgb(hex_color):
+    hex_color = hex_color.lstrip("#")
+    return tuple(int(hex_color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+@lru_cache(maxsize=256)
+def _pie_ops(values, colors, cx, cy, radius, k, page_height):
+    # Filled polygon wedges in raw PDF operators (points, origin bottom-left).
+    total = sum(values)
+    if total <= 0:
+        return ""
+    ops = []
+    angle = -math.pi / 2
+    to_pdf = lambda x, y: f"{x * k:.2f} {(page_height - y) * k:.2f}"
+    for value, color in zip(values, colors):
+        sweep = 2 * math.pi * value / total
+        if sweep <= 0:
+            continue
+        steps = max(2, int(sweep / (math.pi / 36)) + 1)
+        path = [to_pdf(cx, cy) + " m"]
+        for i in range(steps + 1):
+            a = angle + sweep * i / steps
+            path.append(to_pdf(cx + radius * math.cos(a), cy + radius * math.sin(a)) + " l")
+        r, g, b = _rgb(color)
+        ops.append(f"{r:.3f} {g:.3f} {b:.3f} rg " + " ".join(path) + " h f")
+        angle += sweep
+    return "\n".join(ops)
+
+
+@lru_cache(maxsize=256)
+def _line_chart_ops(series, colors, x, y, width, height, y_max, k, page_height):
+    to_pdf = lambda px, py: f"{px * k:.2f} {(page_height - py) * k:.2f}"
+    ops = ["0.6 0.6 0.6 RG 0.2 w",
+           f"{to_pdf(x, y)} m {to_pdf(x, y + height)} l {to_pdf(x + width, y + height)} l S"]
+    for values, color in zip(series, colors):
+        if not values:
+            continue
+        r, g, b = _rgb(color)
+        step = width / max(len(values) - 1, 1)
+        points = [to_pdf(x + i * step, y + height - (v / y_max) * height if y_max else y + height)
+                  for i, v in enumerate(values)]
+        ops.append(f"{r:.3f} {g:.3f} {b:.3f} RG 0.4 w {points[0]} m " + " ".join(p + " l" for p in points[1:]) + " S")
+    return "\n".join(ops)
+
+
+def _downsample(values, max_points=MAX_CHART_POINTS):
+    values = np.asarray(values, dtype=float)
+    if len(values) <= max_points:
+        return tuple(round(v, 2) for v in values)
+    # Bucket means keep the curve's shape while bounding vertices per series.
+    edges = np.linspace(0, len(values), max_points + 1).astype(int)
+    return tuple(round(v, 2) for v in np.add.reduceat(values, edges[:-1]) / np.diff(edges))
+
+# -------------------------------
+# RENDERER
+# -------------------------------
+class ReportPDF(FPDF):
+    def __init__(self, title):
+        super().__init__()
+        self.report_title = title
+        self.set_auto_page_break(True, margin=15)
+        self.alias_nb_pages()
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", "I", 8)
+        self.set_text_color(120, 120, 120)
+        self.cell(0, 8, f"{_latin1(self.report_title)} - page {self.page_no()}/{{nb}}", align="C")
+        self.set_text_color(0, 0, 0)
+
+    def section(self, title):
+        if self.get_y() > self.h - 40:
+            self.add_page(self.cur_orientation)
+        self.ln(4)
+        self.set_font("Arial", "B", 13)
+        self.set_fill_color(235, 240, 248)
+        self.cell(0, 8, _latin1(title), ln=True, fill=True)
+        self.ln(2)
+
+    def key_value_table(self, rows, key_width=55):
+        value_width = self.w - self.l_margin - self.r_margin - key_width
+        for key, value in rows:
+            self.set_font("Arial", "B", 10)
+            y = self.get_y()
+            self.cell(key_width, 6, _latin1(key))
+            self.set_font("Arial", "", 10)
+            self.set_xy(self.l_margin + key_width, y)
+            self.multi_cell(value_width, 6, _latin1(value))
+
+    def table(self, header, rows, widths, aligns):
+        """Simple grid table; the header repeats after every page break."""
+        line_height = 5
+
+        def draw_header():
+            self.set_font("Arial", "B", 8)
+            self.set_fill_color(220, 226, 236)
+            for text, width in zip(header, widths):
+                self.cell(width, line_height + 1, _fit("helveticaB", 8, text, width - 1), border=1, align="C", fill=True)
+            self.ln()
+            self.set_font("Arial", "", 8)
+
+        draw_header()
+        for row in rows:
+            if self.get_y() + line_height > self.page_break_trigger:
+                self.add_page(self.cur_orientation)
+                draw_header()
+            for text, width, align in zip(row, widths, aligns):
+                self.cell(width, line_height, _fit("helvetica", 8, text, width - 1), border=1, align=align)
+            self.ln()
+
+    def pie(self, title, allocation, x, y, radius):
+        channels = list(allocation)
+        colors = tuple(base_colors[i % len(base_colors)] for i in range(len(channels)))
+        values = tuple(float(allocation[ch]) for ch in channels)
+        self.set_xy(x, y)
+        self.set_font("Arial", "B", 10)
+        self.cell(2 * radius + 40, 6, _latin1(title))
+        self._out(_pie_ops(values, colors, x + radius, y + 8 + radius, radius, self.k, self.h))
+        legend_y = y + 8
+        self.set_font("Arial", "", 7)
+        total = sum(values) or 1
+        for ch, value, color in zip(channels, values, colors):
+            self.set_fill_color(*[int(c * 255) for c in _rgb(color)])
+            self.rect(x + 2 * radius + 4, legend_y + 1, 3, 3, "F")
+            self.set_xy(x + 2 * radius + 8, legend_y)
+            self.cell(36, 5, _fit("helvetica", 7, f"{ch} {value / total * 100:.0f}%", 36))
+            legend_y += 5
+
+    def line_chart(self, labels, channels, matrix, x, y, width, height):
+        series = tuple(_downsample(row) for row in matrix)
+        colors = tuple(base_colors[i % len(base_colors)] for i in range(len(channels)))
+        y_max = max((max(s) for s in series if s), default=0) or 1
+        self._out(_line_chart_ops(series, colors, x, y, width, height, round(y_max, 2), self.k, self.h))
+        self.set_font("Arial", "", 7)
+        for fraction in (0, 0.5, 1):
+            self.set_xy(x - 22, y + height - fraction * height - 2)
+            self.cell(20, 4, f"${y_max * fraction:,.0f}", align="R")
+        for index in sorted({0, len(labels) // 2, len(labels) - 1}):
+            position = index / max(len(labels) - 1, 1)
+            self.set_xy(x + position * width - 15, y + height + 1)
+            self.cell(30, 4, _latin1(labels[index]), align="C")
+        legend_x, legend_y = x, y + height + 7
+        for ch, color in zip(channels, colors):
+            if legend_x + 38 > x + width:
+                legend_x, legend_y = x, legend_y + 5
+            self.set_fill_color(*[int(c * 255) for c in _rgb(color)])
+            self.rect(legend_x, legend_y + 1, 3, 3, "F")
+            self.set_xy(legend_x + 4, legend_y)
+            self.cell(34, 5, _fit("helvetica", 7, ch, 34))
+            legend_x += 38
+        self.set_y(legend_y + 8)
+
+
+def render_report(report):
+    pdf = ReportPDF(report["title"])
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, _latin1(report["title"]), ln=True, align="C")
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 8, f"Report Date: {report['date']}", ln=True, align="C")
+
+    pdf.section("Client Inputs")
+    pdf.key_value_table(report["inputs"])
+
+    if report["strategy"]:
+        pdf.section("Strategic Details")
+        pdf.key_value_table(report["strategy"])
+
+    if report["updated"]:
+        pdf.section("Channel Allocation")
+        channels = list(report["updated"])
+        rows = [(ch, f"{report['recommended'].get(ch, 0):.1f}%", f"{report['updated'][ch]}%",
+                 f"${report['investment'].get(ch, 0):,.0f}") for ch in channels]
+        pdf.table(["Channel", "Recommended", "Updated", "Investment"], rows, [70, 35, 35, 50], ["L", "R", "R", "R"])
+        if pdf.get_y() > pdf.h - 85:
+            pdf.add_page()
+        chart_y = pdf.get_y() + 4
+        pdf.pie("Recommended Allocation", report["recommended"], pdf.l_margin, chart_y, 22)
+        pdf.pie("Updated Allocation", report["updated"], pdf.l_margin + 95, chart_y, 22)
+        pdf.set_y(chart_y + 8 + max(44, 5 * len(channels)) + 4)
+
+    flighting = report.get("flighting")
+    if flighting is not None:
+        pdf.add_page("L")
+        pdf.section(f"Flighting: Investment by {flighting['granularity']}")
+        matrix = np.asarray(flighting["matrix"])
+        pdf.line_chart(flighting["labels"], flighting["channels"], matrix, pdf.l_margin + 24, pdf.get_y() + 2,
+                       pdf.w - pdf.l_margin - pdf.r_margin - 30, 70)
+        totals = matrix.sum(axis=0)
+        for start in range(0, len(flighting["channels"]), FLIGHTING_TABLE_CHANNELS_PER_BLOCK):
+            block = flighting["channels"][start:start + FLIGHTING_TABLE_CHANNELS_PER_BLOCK]
+            header = ["Period"] + block + ["All Channels"]
+            channel_width = (pdf.w - pdf.l_margin - pdf.r_margin - 30 - 26) / len(block)
+            widths = [30] + [channel_width] * len(block) + [26]
+            rows = (
+                [label] + [f"${matrix[start + c, p]:,.0f}" for c in range(len(block))] + [f"${totals[p]:,.0f}"]
+                for p, label in enumerate(flighting["labels"])
+            )
+            pdf.ln(3)
+            pdf.table(header, rows, widths, ["L"] + ["R"] * (len(block) + 1))
+        pdf.add_page("P")
+
+    pdf.section("Final Plan Summary")
+    for paragraph in str(report["summary"]).split("\n"):
+        stripped = paragraph.strip()
+        heading = stripped.startswith("#") or stripped.startswith("TLDR") or re.fullmatch(r"\*\*.+\*\*:?", stripped)
+        pdf.set_font("Arial", "B" if heading else "", 10)
+        pdf.multi_cell(0, 5, _latin1(stripped.lstrip("#").replace("**", "").strip()))
+
+    pdf.section("Case Study")
+    pdf.set_font("Arial", "", 10)
+    pdf.multi_cell(0, 5, _latin1(
+        f"Our client [Placeholder] achieved remarkable results by aligning their paid media strategy with {report['top_priority']}."
+    ))
+    return pdf.output(dest="S").encode("latin1", "replace")
@@ -0,0 +1,218 @@
+"""Planning logic shared by the Streamlit app and headless batch runs (no Streamlit imports)."""
+import contextvars
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cortex_cache import make_cache_key
+from cortex_catalog import get_catalog
+from cortex_llm import get_llm_client
+from cortex_metrics import record_llm_call
+from cortex_retrieval import get_reference_index
+
+PLAN_MODEL = "gpt-3.5-turbo"
+FLIGHTING_MODEL = "gpt-3.5-turbo"
+# Bump whenever the flighting prompt or its cached entry format changes so stale patterns are not reused.
+FLIGHTING_PROMPT_VERSION = 3
+# Channel-month values per flighting request; more channels are split into parallel requests.
+FLIGHTING_CELLS_PER_CALL = 96
+FLIGHTING_PARALLEL_CALLS = 4
+FLIGHTING_MAX_TOKENS = 4000
+# Seconds a partial answer (some channels missing) is reused before the request is made again.
+FLIGHTING_PARTIAL_TTL = 15 * 60
+
+FLIGHTING_TIMEOUT = 20
+PLAN_TIMEOUT = 60
+
+# -------------------------------
+# FLIGHTING RESPONSE PARSING AND REPAIR
+# -------------------------------
+def flighting_max_tokens(n_channels, n_months):
+    # About three tokens per integer (digits, comma, space) plus the quoted key and brackets per channel.
+    return min(FLIGHTING_MAX_TOKENS, 32 + n_channels * (12 + 3 * n_months))
+
+def split_channel_groups(channels, n_months, cells_per_call=None):
+    """Split channels so each request asks for at most ``cells_per_call`` channel-month values."""
+    cells_per_call = cells_per_call or FLIGHTING_CELLS_PER_CALL
+    size = max(1, cells_per_call // max(1, n_months))
+    return [channels[i:i + size] for i in range(0, len(channels), size)]
+
+_CHANNEL_LIST_RE = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*\[([^\[\]{}]*)(\])?')
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+def parse_flighting_response(text):
+    """Parse ``{"channel": [numbers, ...], ...}``, recovering what it can from truncated or wrapped JSON.
+
+    A response cut off by the token limit still yields every complete channel
+    and the leading values of the one in progress (repaired later). If that
+    list was cut off right after a number, the number may itself be cut
+    short ("55" as "5"), so it is dropped.
+    """
+    brace = text.find("{")
+    if brace >= 0:
+        try:
+            data = json.loads(text[brace:text.rfind("}") + 1])
+            if isinstance(data, dict):
+                return {str(k): v for k, v in data.items() if isinstance(v, list)}
+        except ValueError:
+            pass
+    patterns = {}
+    for match in _CHANNEL_LIST_RE.finditer(text):
+        values = [float(v) for v in _NUMBER_RE.findall(match.group(2))]
+        if match.group(3) is None and match.group(2).rstrip(".")[-1:].isdigit():
+            values = values[:-1]
+        if values:
+            patterns[json.loads(f'"{match.group(1)}"')] = values
+    return patterns
+
+def repair_pattern(values, n_months):
+    """Coerce one channel's pattern to ``n_months`` non-negative integers summing to exactly 100.
+
+    Missing trailing months take the mean of the months given, extra months are
+    dropped, and the result is renormalized with largest-remainder rounding.
+    Returns None when nothing usable is left.
+    """
+    cleaned = []
+    for value in values[:n_months]:
+        try:
+            cleaned.append(max(0.0, float(value)))
+        except (TypeError, ValueError):
+            cleaned.append(None)
+    known = [v for v in cleaned if v is not None]
+    if not known or sum(known) <= 0:
+        return None
+    fill = sum(known) / len(known)
+    shares = np.array([fill if v is None else v for v in cleaned] + [fill] * (n_months - len(cleaned)))
+    shares = shares * 100.0 / shares.sum()
+    rounded = np.floor(shares).astype(int)
+    remainder = 100 - int(rounded.sum())
+    rounded[np.argsort(rounded - shares, kind="stable")[:remainder]] += 1
+    return rounded.tolist()
+
+# -------------------------------
+# FUNCTION TO GENERATE FLIGHTING PATTERNS VIA AI
+# -------------------------------
+def _request_flighting_group(client, channels, n_months, vertical, top_priority):
+    prompt = (
+        f"Generate a JSON object where the keys are the following channel names: {json.dumps(channels)}. "
+        f"For each channel, output a list of {n_months} integers representing the percentage distribution of that channel's "
+        f"investment over {n_months} months for a campaign in the {vertical} vertical with a top priority of {top_priority}. "
+        f"Each list must sum to 100 and reflect realistic seasonal fluctuations for this industry. "
+        f"Use compact JSON without spaces or line breaks. Return only valid JSON."
+    )
+    completion = client.complete(
+        [{"role": "user", "content": prompt}], FLIGHTING_MODEL,
+        max_tokens=flighting_max_tokens(len(channels), n_months), temperature=0.7,
+        timeout=FLIGHTING_TIMEOUT, purpose="flighting",
+    )
+    parsed = parse_flighting_response(completion.text)
+    patterns = {}
+    for ch in channels:
+        pattern = repair_pattern(parsed.get(ch) or [], n_months)
+        if pattern is not None:
+            patterns[ch] = pattern
+    return patterns
+
+def generate_flighting_patterns(channels, n_months, vertical, top_priority, cache=None, client=None):
+    """Monthly percentage patterns per channel, validated and repaired to ``n_months`` values summing to 100.
+
+    Long campaigns are split into channel groups requested in parallel. Channels
+    the model left out are omitted (they keep the seasonal baseline); errors
+    propagate only when no group produced anything, so the caller can retry.
+    Partial answers are cached too, with the missing channels recorded, but
+    only for ``FLIGHTING_PARTIAL_TTL`` seconds.
+    """
+    client = client or get_llm_client()
+    channels = list(channels)
+    cache_key = make_cache_key(
+        kind="flighting", channels=sorted(channels), n_months=n_months, vertical=vertical,
+        top_priority=top_priority, model=FLIGHTING_MODEL, prompt_version=FLIGHTING_PROMPT_VERSION,
+        backend=client.backend.name,
+    )
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None and (not cached["missing"] or time.time() - cached["cached_at"] <= FLIGHTING_PARTIAL_TTL):
+            record_llm_call("flighting", 0.0, cached=True)
+            return cached["patterns"]
+    groups = split_channel_groups(channels, n_months)
+    patterns, errors = {}, []
+    with ThreadPoolExecutor(max_workers=min(len(groups), FLIGHTING_PARALLEL_CALLS)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _request_flighting_group, client, group, n_months,
+                               vertical, top_priority)
+                   for group in groups]
+        for future in futures:
+            try:
+                patterns.update(future.result())
+            except Exception as e:
+                errors.append(e)
+    if errors and not patterns:
+        raise errors[0]
+    if cache is not None:
+        missing = [ch for ch in channels if ch not in patterns]
+        cache.set(cache_key, {"patterns": patterns, "missing": missing, "cached_at": time.time()})
+    return patterns
+
+# -------------------------------
+# FUNCTIONS TO GENERATE THE FINAL AI PLAN SUMMARY
+# -------------------------------
+def build_base_plan_summary(top_priority, brand_lifecycle, vertical):
+    if top_priority != "-":
+        return (
+            f"Your top priority is {top_priority} for a brand in the {brand_lifecycle} stage operating in the {vertical} vertical. "
+            f"Recommended actions include {get_catalog().objective_details[top_priority]['Strategic Imperatives'].lower()} and leveraging a channel mix updated based on client inputs."
+        )
+    return "No top priority objective selected."
+
+def build_full_plan_messages(brand_name, business_problem, additional_business_info, vertical, creative_formats,
+                             investment_low, investment_high, campaign_start, campaign_end, updated_allocations,
+                             base_summary, marketing_priorities, top_priority, brand_lifecycle):
+    # Only the reference passages most relevant to this brief, within the configured token budget.
+    reference_query = " ".join([
+        vertical, top_priority, business_problem, additional_business_info, brand_lifecycle,
+        " ".join(marketing_priorities), " ".join(get_catalog().objective_details.get(top_priority, {}).values()),
+    ])
+    reference_content = get_reference_index().context_for(reference_query)
+
+    full_context = (
+        f"You are a professional paid media and marketing consultant with deep expertise in the {vertical} vertical and a strong alignment with Junction 37's approach. "
+        f"Generate a final plan summary that includes two parts: first, a 'TLDR:' section with a one-sentence summary; then an expanded analysis (2-3 paragraphs) that includes:\n"
+        f"1. Creative Themes: List 3-5 creative themes that align with the target audiences.\n"
+        f"2. Key Audiences: List 3 key prospecting audiences and 3 key conversion audiences, with reasoning supported by credible marketing articles.\n"
+        f"3. Suggested Flighting: Provide recommendations for how the investment should be distributed over the campaign duration.\n"
+        f"Finally, include 5 specific, real, credible marketing article links from sources such as Ad Age, Marketing Land, Adweek, HubSpot Marketing, and Marketing Dive.\n\n"
+        f"Brand Name: {brand_name}\n"
+        f"Business Problem: {business_problem}\n"
+        f"Additional Business Info: {additional_business_info}\n"
+        f"Client Vertical: {vertical}\n"
+        f"Investment Range: ${investment_low:,} - ${investment_high:,}\n"
+        f"Campaign Start Date: {campaign_start}\n"
+        f"Campaign End Date: {campaign_end}\n"
+        f"Creative Formats Available: {', '.join(creative_formats) if creative_formats else 'None'}\n"
+        f"Marketing Priorities: {', '.join(marketing_priorities) if marketing_priorities else 'None'}\n"
+        f"Updated Channel Allocations: " + ", ".join([f"{ch}: {updated_allocations[ch]}" for ch in updated_allocations]) + "\n"
+        f"Reference Documents: {reference_content}\n\n"
+        f"Other Client Inputs:\n"
+        f"Top Priority Objective: {top_priority}\n"
+        f"Brand Lifecycle Stage: {brand_lifecycle}\n\n"
+        f"Base strategy summary: {base_summary}\n\n"
+        f"Generate a final plan summary with a TLDR section (one sentence) and an expanded analysis (2-3 paragraphs) that includes all the sections described above."
+    )
+    return [
+        {"role": "system", "content": "You are a professional paid media and marketing consultant with deep expertise in the client's vertical and a deep understanding of Junction 37's approach."},
+        {"role": "user", "content": full_context}
+    ]
+
+def stream_full_plan(messages, cancel_event, client=None):
+    return (client or get_llm_client()).stream(
+        messages, PLAN_MODEL, max_tokens=1000, temperature=0.7, timeout=PLAN_TIMEOUT,
+        cancel_event=cancel_event, purpose="plan_stream",
+    )
+
+async def agenerate_full_plan(messages, client=None):
+    completion = await (client or get_llm_client()).acomplete(
+        messages, PLAN_MODEL, max_tokens=1000, temperature=0.7, timeout=PLAN_TIMEOUT, purpose="plan",
+    )
+    return completion.text
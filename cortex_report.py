@@ -0,0 +1,111 @@
+"""Plan report data for the structured multi-page PDF (rendered by cortex_pdf), plus memoized and bulk ZIP export."""
+import datetime
+import hashlib
+import json
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cortex_catalog import get_catalog
+
+REPORT_CACHE_SIZE = 32
+
+# -------------------------------
+# REPORT DATA
+# -------------------------------
+def build_report(plan_inputs, final_plan, recommended_allocation, flighting_plan=None, granularity="Calendar Month"):
+    """Collect everything the renderer needs into plain, picklable data."""
+    top_priority = plan_inputs["top_priority"]
+    updated = plan_inputs["updated_allocations"] or {ch: round(v) for ch, v in recommended_allocation.items()}
+    mid_investment = (plan_inputs["investment_low"] + plan_inputs["investment_high"]) / 2
+    report = {
+        "title": "Cortex Plan Report",
+        "date": datetime.date.today().isoformat(),
+        "inputs": [
+            ("Brand Name", plan_inputs["brand_name"]),
+            ("Business Problem", plan_inputs["business_problem"]),
+            ("Additional Business Info", plan_inputs["additional_business_info"]),
+            ("Investment Range", f"${plan_inputs['investment_low']:,} - ${plan_inputs['investment_high']:,}"),
+            ("Campaign Start Date", str(plan_inputs["campaign_start"])),
+            ("Campaign End Date", str(plan_inputs["campaign_end"])),
+            ("Top Priority Objective", top_priority),
+            ("Brand Lifecycle Stage", plan_inputs["brand_lifecycle"]),
+            ("Client Vertical", plan_inputs["vertical"]),
+            ("Marketing Priorities", ", ".join(plan_inputs["marketing_priorities"]) or "None"),
+            ("Creative Formats Available", ", ".join(plan_inputs["creative_formats"]) or "None"),
+        ],
+        "strategy": list(get_catalog().objective_details.get(top_priority, {}).items()),
+        "recommended": dict(recommended_allocation),
+        "updated": dict(updated),
+        "investment": {ch: mid_investment * pct / 100 for ch, pct in updated.items()},
+        "summary": final_plan,
+        "top_priority": top_priority,
+        "flighting": None,
+    }
+    if flighting_plan is not None and flighting_plan.channels:
+        _, matrix = flighting_plan.rollup(granularity)
+        report["flighting"] = {
+            "granularity": granularity,
+            "labels": flighting_plan.labels(granularity),
+            "channels": list(flighting_plan.channels),
+            "matrix": np.asarray(matrix),
+        }
+    return report
+
+
+def report_fingerprint(report):
+    digest = hashlib.sha256()
+    flighting = report.get("flighting")
+    plain = {k: v for k, v in report.items() if k != "flighting"}
+    digest.update(json.dumps(plain, sort_keys=True, default=str).encode("utf-8"))
+    if flighting is not None:
+        digest.update(json.dumps([flighting["granularity"], flighting["labels"], flighting["channels"]]).encode("utf-8"))
+        digest.update(np.ascontiguousarray(flighting["matrix"], dtype=float).tobytes())
+    return digest.hexdigest()
+
+# -------------------------------
+# RENDERER (fpdf is loaded on the first render, not at import)
+# -------------------------------
+def render_report(report):
+    """The report as PDF bytes (see cortex_pdf)."""
+    from cortex_pdf import render_report as render_pdf
+
+    return render_pdf(report)
+
+# -------------------------------
+# MEMOIZED AND BULK RENDERING
+# -------------------------------
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+
+def render_report_cached(report):
+    """render_report memoized on a hash of the report content."""
+    key = report_fingerprint(report)
+    with _report_cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key]
+    pdf_bytes = render_report(report)
+    with _report_cache_lock:
+        _report_cache[key] = pdf_bytes
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return pdf_bytes
+
+
+def export_reports_zip(reports, destination, max_workers=None, file_names=None):
+    """Render ``reports`` in worker processes and stream the PDFs into one ZIP.
+
+    ``destination`` is a path or a writable binary file object.
+    """
+    reports = list(reports)
+    file_names = file_names or [f"cortex_plan_{i + 1:04d}.pdf" for i in range(len(reports))]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool, \
+            zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, pdf_bytes in zip(file_names, pool.map(render_report, reports, chunksize=4)):
+            archive.writestr(name, pdf_bytes)
+    return len(reports)
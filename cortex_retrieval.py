@@ -0,0 +1,174 @@
+"""Local BM25 retrieval over reference documents for the Final Plan prompt.
+
+Documents come from ``reference.txt`` and any ``.txt``/``.md`` file under the
+reference directory (``CORTEX_REFERENCE_DIR``, default ``reference/``). They
+are split into passages and indexed once; later refreshes only re-read files
+whose size or modification time changed.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+REFERENCE_FILE = "reference.txt"
+REFERENCE_DIR = os.environ.get("CORTEX_REFERENCE_DIR", "reference")
+REFERENCE_TOP_K = int(os.environ.get("CORTEX_REFERENCE_TOP_K", "6"))
+REFERENCE_TOKEN_BUDGET = int(os.environ.get("CORTEX_REFERENCE_TOKEN_BUDGET", "1000"))
+REFERENCE_EXTENSIONS = (".txt", ".md")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or our that the their this to "
+    "was were will with we you your they them these those than then also can more most such not".split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose.
+    return max(1, len(text) // 4)
+
+
+def chunk_text(text, chunk_words=150):
+    """Group paragraphs into passages of about ``chunk_words`` words."""
+    passages, current, size = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        words = len(paragraph.split())
+        if current and size + words > chunk_words:
+            passages.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += words
+    if current:
+        passages.append("\n\n".join(current))
+    return passages
+
+
+class ReferenceIndex:
+    """Incrementally maintained BM25 index over reference passages."""
+
+    def __init__(self, paths, chunk_words=150, k1=1.5, b=0.75, refresh_interval=2.0):
+        self.paths = list(paths)
+        self.chunk_words = chunk_words
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._files = {}       # path -> (signature, [chunk ids])
+        self._chunks = {}      # chunk id -> (path, text, term counts, length)
+        self._postings = {}    # term -> {chunk id: term frequency}
+        self._total_length = 0
+        self._next_id = 0
+        self._last_refresh = None
+
+    def refresh(self, force=False):
+        """Re-index new or changed files and drop deleted ones; returns the number of files re-read."""
+        now = time.monotonic()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return 0
+        with self._lock:
+            self._last_refresh = now
+            seen, changed = set(), 0
+            for path in self._discover():
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                known = self._files.get(path)
+                if known is not None and known[0] == signature:
+                    continue
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+                self._remove_file(path)
+                self._files[path] = (signature, [self._add_chunk(path, passage) for passage in chunk_text(text, self.chunk_words)])
+                changed += 1
+            for path in [p for p in self._files if p not in seen]:
+                self._remove_file(path)
+                changed += 1
+            return changed
+
+    def search(self, query, k=REFERENCE_TOP_K):
+        """Top ``k`` (score, passage, path) results for ``query``."""
+        self.refresh()
+        with self._lock:
+            n_chunks = len(self._chunks)
+            if not n_chunks:
+                return []
+            avg_length = self._total_length / n_chunks
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    length = self._chunks[chunk_id][3]
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    )
+            return [(score, self._chunks[cid][1], self._chunks[cid][0]) for cid, score in scores.most_common(k)]
+
+    def context_for(self, query, k=REFERENCE_TOP_K, token_budget=REFERENCE_TOKEN_BUDGET):
+        """The best-matching passages that fit in ``token_budget``, joined for a prompt."""
+        selected, used = [], 0
+        for _, passage, _ in self.search(query, k):
+            cost = estimate_tokens(passage)
+            if used + cost > token_budget:
+                continue
+            selected.append(passage)
+            used += cost
+        return "\n---\n".join(selected)
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "passages": len(self._chunks), "terms": len(self._postings)}
+
+    def _discover(self):
+        for path in self.paths:
+            if os.path.isfile(path):
+                yield path
+            elif os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    for name in sorted(names):
+                        if name.lower().endswith(REFERENCE_EXTENSIONS):
+                            yield os.path.join(root, name)
+
+    def _add_chunk(self, path, text):
+        chunk_id = self._next_id
+        self._next_id += 1
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self._chunks[chunk_id] = (path, text, counts, length)
+        self._total_length += length
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = tf
+        return chunk_id
+
+    def _remove_file(self, path):
+        known = self._files.pop(path, None)
+        if known is None:
+            return
+        for chunk_id in known[1]:
+            _, _, counts, length = self._chunks.pop(chunk_id)
+            self._total_length -= length
+            for term in counts:
+                postings = self._postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self._postings[term]
+
+
+@lru_cache(maxsize=1)
+def get_reference_index():
+    return ReferenceIndex([REFERENCE_FILE, REFERENCE_DIR])
@@ -0,0 +1,187 @@
+"""Monte Carlo scenario simulation for plan outcome ranges.
+
+Each scenario draws a total budget uniformly within the investment range,
+a performance multiplier per channel (lognormal, mean 1) and a multiplicative
+perturbation per channel and calendar month that moves spend between months
+without changing the channel's total. Spend per reporting period and the
+response index of the budget optimizer's curves are evaluated for every
+scenario with batched array operations, and summarized as percentile bands.
+Scenarios are drawn in batches sized to a fixed number of array cells, and
+each batch is reduced to its period percentiles before the next is drawn,
+so memory does not grow with the scenario count or the campaign length.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from cortex_flighting import period_keys
+from cortex_optimizer import get_budget_optimizer
+
+SIMULATION_SCENARIOS = 20000
+SIMULATION_PERCENTILES = (5, 25, 50, 75, 95)
+PERFORMANCE_SIGMA = 0.25
+FLIGHTING_SIGMA = 0.15
+# Most scenarios per batch. Batches shrink so that batch x max(channels x months, periods)
+# stays within SIMULATION_BATCH_CELLS floats, which bounds the simulation's working memory.
+SCENARIO_BATCH = 4096
+SIMULATION_BATCH_CELLS = 1 << 20
+# Fewest scenarios per batch, so each batch's percentiles stay reliable.
+MIN_SCENARIO_BATCH = 500
+SIMULATION_CACHE_SIZE = 32
+
+SimulationResult = namedtuple(
+    "SimulationResult",
+    "percentiles labels spend_bands budget response cost_per_point scenarios",
+)
+
+
+def _period_index(keys):
+    """Index of each day's period, given per-day period keys in calendar order."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.cumsum(np.r_[False, keys[1:] != keys[:-1]])
+
+
+def _lognormal(rng, sigma, size):
+    # Mean-one lognormal from float32 normals: several times faster than Generator.lognormal.
+    draws = rng.standard_normal(size, dtype=np.float32)
+    draws *= np.float32(sigma)
+    draws -= np.float32(sigma ** 2 / 2)
+    return np.exp(draws, out=draws)
+
+
+def row_percentiles(values, q):
+    """Percentiles of each row (linear interpolation, like np.percentile); sorts ``values`` in place.
+
+    A full sort of every row is much faster than np.percentile's partitioning
+    for thousands of rows of tens of thousands of scenarios.
+    """
+    values.sort(axis=1)
+    positions = np.asarray(q, dtype=float) / 100 * (values.shape[1] - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, values.shape[1] - 1)
+    fraction = positions - lower
+    return (values[:, lower] * (1 - fraction) + values[:, upper] * fraction).T
+
+
+def scenario_batch_size(n_channels, n_months, n_periods):
+    cells = max(n_channels * n_months, n_periods, 1)
+    return int(np.clip(SIMULATION_BATCH_CELLS // cells, MIN_SCENARIO_BATCH, SCENARIO_BATCH))
+
+
+def month_period_weights(plan, granularity):
+    """Channels x calendar months x periods dollars: how each month's spend lands in each reporting period."""
+    months = _period_index(period_keys(plan.days, "Calendar Month"))
+    periods = _period_index(period_keys(plan.days, granularity))
+    n_channels, n_months, n_periods = len(plan.channels), int(months.max(initial=-1)) + 1, int(periods.max(initial=-1)) + 1
+    cell = months * n_periods + periods
+    flat = (np.arange(n_channels)[:, np.newaxis] * (n_months * n_periods) + cell).ravel()
+    weights = np.bincount(flat, weights=plan.values.ravel(), minlength=n_channels * n_months * n_periods)
+    return weights.reshape(n_channels, n_months, n_periods)
+
+
+def simulate_plan(plan, granularity, investment_low, investment_high, vertical, top_priority,
+                  scenarios=SIMULATION_SCENARIOS, seed=0, optimizer=None):
+    """Percentile bands of spend per period and of total-campaign KPI proxies for ``plan``.
+
+    Period bands are the scenario-weighted mean of each batch's percentiles
+    (the batches are never pooled), which is within sampling noise of the
+    percentiles over all scenarios at once.
+    """
+    optimizer = optimizer or get_budget_optimizer()
+    rng = np.random.default_rng(seed)
+    weights = month_period_weights(plan, granularity)
+    n_channels, n_months, n_periods = weights.shape
+    monthly = weights.sum(axis=2)
+    monthly32 = monthly.astype(np.float32)
+    channel_totals = monthly.sum(axis=1)
+    plan_total = channel_totals.sum()
+    # Each month only feeds the contiguous run of periods it overlaps: one small product per month.
+    month_periods = []
+    for m in range(n_months):
+        touched = np.flatnonzero(weights[:, m].any(axis=0))
+        month_periods.append(slice(touched[0], touched[-1] + 1) if len(touched) else slice(0, 0))
+    month_weights = [np.ascontiguousarray(weights[:, m, cols].T, dtype=np.float32)
+                     for m, cols in enumerate(month_periods)]
+    # Plan channels in the optimizer's channel order, for the response curves.
+    columns = [optimizer.channels.index(ch) for ch in plan.channels]
+    low, high = sorted((investment_low, investment_high))
+
+    q = SIMULATION_PERCENTILES
+    batch_size = scenario_batch_size(n_channels, n_months, n_periods)
+    # Periods x scenarios, so the per-period percentiles run over contiguous rows; reused by every batch.
+    spend = np.empty((n_periods, min(batch_size, scenarios)), dtype=np.float32)
+    spend_bands = np.zeros((len(q), n_periods))
+    budget = np.empty(scenarios)
+    response = np.empty(scenarios)
+    for start in range(0, scenarios, batch_size):
+        n = min(batch_size, scenarios - start)
+        batch_budget = rng.uniform(low, high, n) if high > low else np.full(n, float(low))
+        scale = batch_budget / plan_total if plan_total > 0 else np.zeros(n)
+        performance = _lognormal(rng, PERFORMANCE_SIGMA, (n, n_channels))
+        noise = _lognormal(rng, FLIGHTING_SIGMA, (n, n_channels, n_months))
+        # Renormalize so each channel still spends its planned total, only shifted between months.
+        perturbed = (noise * monthly32).sum(axis=2)
+        noise *= np.divide(channel_totals, perturbed, out=np.zeros_like(perturbed),
+                           where=perturbed > 0)[..., np.newaxis].astype(np.float32)
+        batch_spend = spend[:, :n]
+        batch_spend[:] = 0.0
+        for m, cols in enumerate(month_periods):
+            batch_spend[cols] += month_weights[m] @ noise[:, :, m].T
+        batch_spend *= scale.astype(np.float32)
+        spend_bands += row_percentiles(batch_spend, q) * n
+
+        channel_spend = np.zeros((n, len(optimizer.channels)))
+        channel_spend[:, columns] = scale[:, np.newaxis] * channel_totals
+        channel_performance = np.ones_like(channel_spend)
+        channel_performance[:, columns] = performance
+        budget[start:start + n] = batch_budget
+        response[start:start + n] = optimizer.response_batch(vertical, top_priority, channel_spend, channel_performance)
+
+    has_response = bool(response.any())
+    return SimulationResult(
+        percentiles=q,
+        labels=plan.labels(granularity),
+        spend_bands=spend_bands / scenarios if scenarios else spend_bands,
+        budget=np.percentile(budget, q),
+        response=np.percentile(response, q) if has_response else None,
+        cost_per_point=np.percentile(budget / response, q) if has_response and response.all() else None,
+        scenarios=scenarios,
+    )
+
+# -------------------------------
+# CACHE PER INPUT SET
+# -------------------------------
+_simulation_cache = OrderedDict()
+_simulation_cache_lock = threading.Lock()
+
+
+def simulation_key(plan, granularity, investment_low, investment_high, vertical, top_priority,
+                   scenarios=SIMULATION_SCENARIOS, seed=0, catalog_version=None):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(plan.values).tobytes())
+    digest.update(np.ascontiguousarray(plan.days).tobytes())
+    digest.update(repr((list(plan.channels), granularity, investment_low, investment_high, vertical,
+                        top_priority, scenarios, seed, catalog_version)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def simulate_plan_cached(plan, granularity, investment_low, investment_high, vertical, top_priority,
+                         scenarios=SIMULATION_SCENARIOS, seed=0):
+    """simulate_plan memoized on the plan contents, the catalog and every input that affects the draws."""
+    optimizer = get_budget_optimizer()
+    key = simulation_key(plan, granularity, investment_low, investment_high, vertical, top_priority, scenarios, seed,
+                         optimizer.version)
+    with _simulation_cache_lock:
+        if key in _simulation_cache:
+            _simulation_cache.move_to_end(key)
+            return _simulation_cache[key]
+    result = simulate_plan(plan, granularity, investment_low, investment_high, vertical, top_priority,
+                           scenarios, seed, optimizer)
+    with _simulation_cache_lock:
+        _simulation_cache[key] = result
+        while len(_simulation_cache) > SIMULATION_CACHE_SIZE:
+            _simulation_cache.popitem(last=False)
+    return result
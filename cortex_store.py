@@ -0,0 +1,278 @@
+"""Persistent plan store: full plan snapshots, plan history and deduplicated AI outputs in SQLite.
+
+The database runs in WAL mode so readers never block the writer. All writes
+go through one background thread that drains a queue and commits whatever
+has accumulated in a single transaction; sessions hand off a snapshot and
+continue instead of waiting on the database lock. Summary texts and PDFs are
+stored once per content hash, however many plans reference them.
+"""
+import datetime
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+import numpy as np
+
+from cortex_report import report_fingerprint
+
+DEFAULT_STORE_PATH = os.environ.get("CORTEX_PLAN_STORE", os.path.join(".cortex_data", "plans.sqlite3"))
+STORE_BATCH_SIZE = 64
+HISTORY_LIMIT = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY, kind TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    brand TEXT NOT NULL,
+    vertical TEXT NOT NULL,
+    objective TEXT NOT NULL,
+    campaign_start TEXT,
+    campaign_end TEXT,
+    investment_low INTEGER,
+    investment_high INTEGER,
+    catalog_version TEXT,
+    inputs TEXT NOT NULL,
+    allocations TEXT NOT NULL,
+    flighting TEXT,
+    summary_hash TEXT REFERENCES blobs (hash),
+    pdf_hash TEXT REFERENCES blobs (hash)
+);
+CREATE INDEX IF NOT EXISTS plans_brand ON plans (brand, created_at);
+CREATE INDEX IF NOT EXISTS plans_vertical ON plans (vertical, created_at);
+CREATE INDEX IF NOT EXISTS plans_objective ON plans (objective, created_at);
+CREATE INDEX IF NOT EXISTS plans_created ON plans (created_at);
+CREATE INDEX IF NOT EXISTS plans_campaign_start ON plans (campaign_start);
+CREATE TABLE IF NOT EXISTS llm_outputs (
+    request_key TEXT PRIMARY KEY, output_hash TEXT NOT NULL REFERENCES blobs (hash), created_at REAL NOT NULL
+);
+"""
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+
+class PlanStore:
+    """SQLite-backed plan history shared by every session in the process (and safe across processes)."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, batch_size=STORE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(plans)")}
+        if "catalog_version" not in columns:  # stores created before plans recorded it
+            try:
+                conn.execute("ALTER TABLE plans ADD COLUMN catalog_version TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # another process migrated it first
+                    raise
+        conn.close()
+        self._readers = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="cortex-plan-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        # A generous busy timeout only matters when another process holds the write lock.
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = self._connect()
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    # -------------------------------
+    # WRITES (queued to the writer thread, group-committed)
+    # -------------------------------
+    def _submit(self, operations):
+        future = Future()
+        self._queue.put((operations, future))
+        return future
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        for attempt in range(5):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for operations, _ in batch:
+                    for sql, params in operations:
+                        conn.execute(sql, params)
+                conn.execute("COMMIT")
+                break
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if isinstance(e, sqlite3.OperationalError) and "locked" in str(e) and attempt < 4:
+                    time.sleep(0.05 * (2 ** attempt))  # another process holds the write lock
+                    continue
+                if len(batch) > 1:
+                    # Commit the rest without the failing write.
+                    for item in batch:
+                        self._commit(conn, [item])
+                else:
+                    batch[0][1].set_exception(e)
+                return
+        for _, future in batch:
+            future.set_result(True)
+
+    @staticmethod
+    def _blob_operation(kind, data):
+        raw = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        digest = content_hash(raw)
+        return digest, ("INSERT OR IGNORE INTO blobs (hash, kind, data, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (digest, kind, raw, len(raw), time.time()))
+
+    def save_plan(self, plan_inputs, report, pdf_bytes=None, catalog_version=None):
+        """Queue a full snapshot; returns ``(plan_id, future)``. Identical snapshots are stored once.
+
+        ``catalog_version`` records which taxonomy catalog produced the allocations.
+        """
+        plan_id = report_fingerprint(report)
+        operations = []
+        summary_hash, operation = self._blob_operation("summary", report["summary"] or "")
+        operations.append(operation)
+        pdf_hash = None
+        if pdf_bytes is not None:
+            pdf_hash, operation = self._blob_operation("pdf", pdf_bytes)
+            operations.append(operation)
+        allocations = {"recommended": report["recommended"], "updated": report["updated"],
+                       "investment": report["investment"]}
+        operations.append((
+            "INSERT OR IGNORE INTO plans (plan_id, created_at, brand, vertical, objective, campaign_start, "
+            "campaign_end, investment_low, investment_high, catalog_version, inputs, allocations, flighting, "
+            "summary_hash, pdf_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (plan_id, time.time(), plan_inputs["brand_name"], plan_inputs["vertical"], plan_inputs["top_priority"],
+             str(plan_inputs["campaign_start"]), str(plan_inputs["campaign_end"]), int(plan_inputs["investment_low"]),
+             int(plan_inputs["investment_high"]), catalog_version, _dumps(plan_inputs), _dumps(allocations),
+             _dumps(report["flighting"]) if report.get("flighting") else None, summary_hash, pdf_hash),
+        ))
+        return plan_id, self._submit(operations)
+
+    def record_llm_output(self, request_key, text):
+        """Remember the output for an LLM request so identical requests can reuse it."""
+        output_hash, operation = self._blob_operation("llm_output", text)
+        return self._submit([
+            operation,
+            ("INSERT OR REPLACE INTO llm_outputs (request_key, output_hash, created_at) VALUES (?, ?, ?)",
+             (request_key, output_hash, time.time())),
+        ])
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed."""
+        self._submit([]).result(timeout)
+
+    # -------------------------------
+    # READS (per-thread connections; WAL readers never wait on the writer)
+    # -------------------------------
+    def find_llm_output(self, request_key):
+        row = self._reader().execute(
+            "SELECT b.data FROM llm_outputs o JOIN blobs b ON b.hash = o.output_hash WHERE o.request_key = ?",
+            (request_key,),
+        ).fetchone()
+        return row[0].decode("utf-8") if row is not None else None
+
+    def history(self, brand=None, vertical=None, objective=None, since=None, until=None, limit=HISTORY_LIMIT):
+        """Newest-first plan summaries (no blobs) filtered on the indexed columns."""
+        clauses, params = [], []
+        for column, value in (("brand", brand), ("vertical", vertical), ("objective", objective)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(
+            "SELECT plan_id, created_at, brand, vertical, objective, campaign_start, campaign_end, "
+            f"investment_low, investment_high, catalog_version, pdf_hash IS NOT NULL AS has_pdf FROM plans {where} "
+            "ORDER BY created_at DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def distinct(self, column):
+        if column not in ("brand", "vertical", "objective"):
+            raise ValueError(f"Not an indexed plan column: {column}")
+        return [row[0] for row in self._reader().execute(f"SELECT DISTINCT {column} FROM plans ORDER BY {column}")]
+
+    def load_plan(self, plan_id):
+        """The full snapshot for ``plan_id`` (PDF excluded; see ``load_pdf``), or None."""
+        row = self._reader().execute(
+            "SELECT p.*, b.data AS summary FROM plans p LEFT JOIN blobs b ON b.hash = p.summary_hash "
+            "WHERE p.plan_id = ?",
+            (plan_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        plan = dict(row)
+        plan["inputs"] = json.loads(plan["inputs"])
+        plan["allocations"] = json.loads(plan["allocations"])
+        plan["flighting"] = json.loads(plan["flighting"]) if plan["flighting"] else None
+        plan["summary"] = plan["summary"].decode("utf-8") if plan["summary"] is not None else ""
+        return plan
+
+    def load_pdf(self, plan_id):
+        row = self._reader().execute(
+            "SELECT b.data FROM plans p JOIN blobs b ON b.hash = p.pdf_hash WHERE p.plan_id = ?", (plan_id,)
+        ).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def stats(self):
+        conn = self._reader()
+        plans = conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"plans": plans, "blobs": blobs, "blob_bytes": size, "queued_writes": self._queue.qsize()}
+
+
+@lru_cache(maxsize=1)
+def get_plan_store():
+    """The process-wide plan store, shared by every session (and pre-opened by cortex_warmup)."""
+    return PlanStore()
@@ -0,0 +1,177 @@
+"""Optional warm-up before serving: heavy imports, caches and connection pools, built ahead of the first session.
+
+The app imports pandas, openai and fpdf only when a table, an AI call or a
+PDF first needs them, so a cold process starts quickly but the first session
+pays for them. Run through this entry point to pay that up front instead:
+
+    python cortex_warmup.py --serve -- --server.port 8501
+
+warms up in-process and only then starts Streamlit, so the server's health
+check (``/_stcore/health``) passes once the process is ready for traffic.
+Without ``--serve`` it warms up, prints the timings and exits. Either way a
+ready marker (``CORTEX_READY_FILE``) is written on success, holding the step
+timings, for readiness probes that check a file; a stale marker is removed
+first. ``CORTEX_WARMUP_CONNECT=1`` also opens a connection to the LLM API.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cortex_mindmap.py")
+READY_FILE = os.environ.get("CORTEX_READY_FILE", os.path.join(".cortex_data", "ready"))
+WARMUP_CONNECT = os.environ.get("CORTEX_WARMUP_CONNECT", "0") == "1"
+
+
+# -------------------------------
+# STEPS (each fills a process-wide cache the first session would otherwise build)
+# -------------------------------
+@lru_cache(maxsize=1)
+def _sample_plan():
+    from cortex_allocation import compute_normalized_allocation
+    from cortex_catalog import get_catalog
+    from cortex_flighting import FlightingPlan
+
+    catalog = get_catalog()
+    vertical, top_priority = catalog.verticals[0], catalog.objectives[0]
+    allocation = compute_normalized_allocation(vertical, top_priority)
+    start = datetime.date.today()
+    end = start + datetime.timedelta(days=30)
+    plan = FlightingPlan.build(list(allocation), [1000 * share for share in allocation.values()], start, end,
+                               vertical, top_priority)
+    return vertical, top_priority, allocation, plan
+
+
+def _warm_planning():
+    from cortex_optimizer import get_budget_optimizer
+
+    vertical, top_priority, _, _ = _sample_plan()
+    optimizer = get_budget_optimizer()
+    optimizer.frontier(vertical, top_priority, 100000, 200000)
+
+
+def _warm_reference_index():
+    from cortex_retrieval import get_reference_index
+
+    get_reference_index()
+
+
+def _warm_llm(connect):
+    from cortex_llm import get_llm_client
+
+    get_llm_client().warm(connect)
+
+
+def _warm_stores():
+    from cortex_cache import get_llm_cache
+    from cortex_store import get_plan_store
+
+    # The same process-wide instances the app uses: databases created or migrated, connections open.
+    get_llm_cache()
+    get_plan_store().flush()
+
+
+def _warm_tables():
+    import pyarrow
+
+    _, _, _, plan = _sample_plan()
+    pyarrow.Table.from_pandas(plan.to_frame("Weekly"))
+
+
+def _warm_charts():
+    import plotly.io
+
+    from cortex_charts import FlightingChart, FrontierChart, PieChart, layout_template
+
+    _, _, allocation, plan = _sample_plan()
+    for kind in ("pie", "frontier", "flighting"):
+        layout_template(kind)
+    pie = PieChart()
+    pie.update("warmup", allocation, "Warm-up")
+    chart = FlightingChart(plan.channels)
+    _, matrix = plan.rollup("Weekly")
+    chart.update("warmup", plan.labels("Weekly"), matrix, "Weekly")
+    FrontierChart()
+    plotly.io.to_json(chart.figure, validate=False)
+
+
+def _warm_pdf():
+    from cortex_report import build_report, render_report
+
+    vertical, top_priority, allocation, plan = _sample_plan()
+    plan_inputs = dict(
+        brand_name="Warm-up", business_problem="-", additional_business_info="-", vertical=vertical,
+        creative_formats=[], investment_low=100000, investment_high=200000, campaign_start=plan.days[0],
+        campaign_end=plan.days[-1], updated_allocations={}, base_summary="", marketing_priorities=[],
+        top_priority=top_priority, brand_lifecycle="-",
+    )
+    render_report(build_report(plan_inputs, "TLDR: warm-up.", allocation, plan, "Weekly"))
+
+
+def warm_up(connect=WARMUP_CONNECT):
+    """Run every warm-up step; returns milliseconds per step."""
+    steps = [
+        ("planning", _warm_planning),
+        ("reference_index", _warm_reference_index),
+        ("llm_client", lambda: _warm_llm(connect)),
+        ("stores", _warm_stores),
+        ("tables", _warm_tables),
+        ("charts", _warm_charts),
+        ("pdf", _warm_pdf),
+    ]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+
+# -------------------------------
+# READY MARKER
+# -------------------------------
+def clear_ready(path=READY_FILE):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def mark_ready(timings, path=READY_FILE):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "ready_at": time.time(), "warmup_ms": timings}, f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm up the Cortex app process, optionally then serve it.")
+    parser.add_argument("--serve", action="store_true", help="Start Streamlit in this process after warming up")
+    parser.add_argument("--connect", action="store_true", default=WARMUP_CONNECT,
+                        help="Also open a connection to the LLM API")
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER,
+                        help="Arguments for `streamlit run` (after --), with --serve")
+    args = parser.parse_args(argv)
+
+    clear_ready()
+    start = time.perf_counter()
+    timings = warm_up(args.connect)
+    mark_ready(timings)
+    print(f"Warm-up done in {(time.perf_counter() - start) * 1000:.0f} ms: "
+          + ", ".join(f"{name} {ms:.0f}" for name, ms in timings.items()), file=sys.stderr)
+    if not args.serve:
+        return 0
+
+    from streamlit.web import cli as stcli
+
+    extra = args.streamlit_args[1:] if args.streamlit_args[:1] == ["--"] else args.streamlit_args
+    sys.argv = ["streamlit", "run", APP_SCRIPT, *extra]
+    return stcli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())